@@ -60,6 +60,7 @@ setuptools.setup(
     description='Benchmarking and optimization tools for tomography.',
     packages=setuptools.find_packages(exclude=['docs']),
     include_package_data=True,
+    python_requires='>=3.7',
 #    install_requires=['six', 'numpy'],
     url='http://github.com/tomography/xdesign.git',
     keywords=['xdesign', 'tomography'],
@@ -68,9 +69,8 @@ setuptools.setup(
     classifiers=[
         'Development Status :: 3 - Alpha',
         'License :: OSI Approved :: BSD License',
-        'Programming Language :: Python :: 2.7',
-        'Programming Language :: Python :: 3.4',
-        'Programming Language :: Python :: 3.5',
+        'Programming Language :: Python :: 3.7',
+        'Programming Language :: Python :: 3.8',
         'Operating System :: OS Independent',
         'Topic :: Scientific/Engineering :: Physics',
         'Topic :: Scientific/Engineering :: Chemistry',
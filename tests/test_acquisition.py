@@ -3,10 +3,23 @@ from __future__ import (absolute_import, division, print_function,
 
 import numpy as np
 import os.path
+import shutil
+import tempfile
 
-from xdesign.acquisition import raster_scan, sinogram
-from xdesign.material import XDesignDefault
-from numpy.testing import assert_allclose
+from xdesign.acquisition import (Probe, Scan, ProjectionCache, SinogramCache,
+                                 raster_scan, angle_scan,
+                                 sinogram, angleogram, project,
+                                 project_stack, project_polychromatic,
+                                 iter_projections, create_sinogram_file,
+                                 load_sinogram_file, photon_noise,
+                                 projection_matrix, project_areas, Beam,
+                                 beampoly, beamintersect)
+from xdesign.algorithms import art
+from xdesign.geometry import (Circle, Ellipse, Superellipse, Point,
+                              Square)
+from xdesign.material import Material, XDesignDefault, DogaCircles, UnitCircle
+from xdesign.phantom import Phantom
+from numpy.testing import assert_allclose, assert_equal, assert_raises
 
 
 def test_raster_scan():
@@ -34,3 +47,461 @@ def test_sinogram():
     sino_reference = np.load(ref_file)
 
     assert_allclose(sino, sino_reference, atol=1e-2)
+
+
+def test_project_matches_measure():
+    np.random.seed(0)
+    p = DogaCircles(n_sizes=3)
+    p.append(Phantom(geometry=Circle(Point([0.5, 0.5]), 0.1), mass_atten=2,
+                     children=[Phantom(geometry=Circle(Point([0.5, 0.5]),
+                                                       0.05),
+                                       mass_atten=-1)]))
+    p.append(Phantom(geometry=Ellipse(Point([0.3, 0.6]), 0.2, 0.05),
+                     mass_atten=1))
+    p.append(Phantom(geometry=Superellipse(Point([0.7, 0.3]), 0.1, 0.15, 4),
+                     mass_atten=1))
+    sino, probe = sinogram(8, 16, p)
+
+    reference = np.zeros((8, 16))
+    scan = raster_scan(8, 16)
+    for m in range(8):
+        for n in range(16):
+            reference[m, n] = next(scan).measure(p)
+
+    assert_allclose(sino, reference, rtol=1e-8, atol=1e-14)
+    assert_allclose(np.array(probe.history),
+                    np.array([q.list for q in raster_scan(8, 16)]),
+                    atol=1e-10)
+
+
+def test_sinogram_workers():
+    p = XDesignDefault()
+    sino, probe = sinogram(16, 8, p)
+    sino_parallel, probe_parallel = sinogram(16, 8, p, workers=3)
+
+    assert_allclose(sino_parallel, sino)
+    assert_allclose(np.array(probe_parallel.history), np.array(probe.history))
+
+
+def test_project_after_changing_children():
+    p = UnitCircle(radius=0.5, mass_atten=0)
+    theta, offset = np.meshgrid(np.linspace(0, np.pi, 5),
+                                np.linspace(-0.5, 1.5, 21))
+    assert_allclose(project(p, theta, offset, 0.1), 0)
+
+    c = Phantom(geometry=Circle(Point([0.5, 0.5]), 0.1), mass_atten=1)
+    p.append(c)
+    reference = project(c, theta, offset, 0.1)
+    assert_allclose(project(p, theta, offset, 0.1), reference)
+
+    c.translate([0.2, 0])
+    reference = project(c, theta, offset, 0.1)
+    assert_allclose(project(p, theta, offset, 0.1), reference)
+
+    p.pop()
+    assert_allclose(project(p, theta, offset, 0.1), 0)
+
+
+def test_project_after_editing_geometry_directly():
+    np.random.seed(0)
+    p = Phantom(geometry=Circle(Point([0.5, 0.5]), 0.5), mass_atten=0.1)
+    p.sprinkle(10, 0.05, mass_atten=1)
+    p.children[4].append(Phantom(geometry=Circle(p.children[4].center, 0.02),
+                                 mass_atten=-1))
+    scan = Scan.raster(8, 32)
+    cache = ProjectionCache(p, scan)
+    project(p, scan)
+
+    p.children[0].geometry.radius = 0.1
+    p.children[0].geometry.center.translate([0.01, 0])
+    p.children[4].children[0].geometry.center.translate([0.005, 0])
+    p.children[1].mass_atten = 2
+    data = cache.refresh()
+    reference = sum(project(child, scan) for child in p.children)
+    reference += project(Phantom(geometry=p.geometry, mass_atten=0.1), scan)
+    assert_allclose(data, reference, atol=1e-12)
+    assert_allclose(project(p, scan), reference, atol=1e-12)
+
+    # Measuring ray by ray needs an explicit refresh after direct edits.
+    shift = 0.15 * np.sign(0.5 - p.children[0].center.x)
+    offset = p.children[0].center.x + shift
+    probe = Probe(Point([offset, -1]), Point([offset, 2]), 0.01)
+    probe.measure(p)
+    p.children[0].geometry.center.translate([shift, 0])
+    p.refresh()
+    assert_allclose(probe.measure(p), project(p, [0], [offset], 0.01))
+
+    p.children.reverse()
+    assert_equal(p.compiled.phantoms[1], p.children[0])
+
+
+def test_probe_history_grows_and_spills():
+    probe = Probe(Point([0, 0]), Point([1, 0]), spill=20)
+    positions = []
+    for i in range(50):
+        probe.translate(0.1)
+        probe.record()
+        positions.append(probe.list)
+    assert probe.history.shape == (50, 4)
+    assert isinstance(probe.history, np.memmap)
+    assert_allclose(probe.history, np.array(positions))
+
+
+def test_iter_projections_matches_sinogram():
+    p = DogaCircles(n_sizes=3, size_ratio=0.5, n_shuffles=0)
+    sino, _ = sinogram(4, 16, p)
+    rows = list(iter_projections(p, raster_scan(4, 16), 16))
+    assert len(rows) == 4
+    assert_allclose([angle for angle, _ in rows], np.arange(4) * np.pi / 4,
+                    atol=1e-12)
+    assert_allclose(np.array([row for _, row in rows]), sino, atol=1e-12)
+
+
+def test_iter_projections_needs_sy_for_generators():
+    p = UnitCircle(radius=0.3, mass_atten=1)
+    assert_raises(ValueError, iter_projections, p, raster_scan(4, 16))
+
+
+def test_sinogram_probe_history():
+    p = UnitCircle(radius=0.3, mass_atten=1)
+    for function, scan in [(sinogram, Scan.raster(3, 4)),
+                           (angleogram, Scan.angle(3, 4))]:
+        _, probe = function(3, 4, p)
+        assert_allclose(probe.list, scan.probe().list)
+        assert_allclose(probe.history, scan.history)
+        probe.record()
+        assert_allclose(probe.history[:-1], scan.history)
+        assert_allclose(probe.history[-1], probe.list)
+
+
+def test_sinogram_file():
+    p = DogaCircles(n_sizes=3, size_ratio=0.5, n_shuffles=0)
+    sino, _ = sinogram(4, 16, p)
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(tmpdir, 'sino.npy')
+        out = create_sinogram_file(filename, 4, 16)
+        result, _ = sinogram(4, 16, p, out=out)
+        assert result is out
+        del out, result
+
+        saved, metadata = load_sinogram_file(filename)
+        assert_allclose(saved, sino)
+        assert metadata['sx'] == 4 and metadata['sy'] == 16
+        assert_allclose(metadata['angles'], np.arange(4) * np.pi / 4)
+        del saved
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_scan_matches_scan_generators():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        for generator, scan in [(raster_scan, Scan.raster(3, 4)),
+                                (angle_scan, Scan.angle(3, 4))]:
+            positions = [p.list for p in generator(3, 4)]
+            assert_allclose(scan.history, positions, atol=1e-12)
+            assert scan.shape == (3, 4)
+            assert_allclose(scan[1].history, positions[4:8], atol=1e-12)
+            assert scan[:, ::2].shape == (3, 2)
+
+            filename = os.path.join(tmpdir, 'scan.npz')
+            scan.save(filename)
+            assert Scan.load(filename) == scan
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_scan_project_and_reconstruct():
+    p = DogaCircles(n_sizes=3, size_ratio=0.5, n_shuffles=0)
+    sino, probe = sinogram(4, 8, p)
+    scan = Scan.raster(4, 8)
+    assert_allclose(project(p, scan), sino, atol=1e-12)
+    assert_allclose([row for _, row in iter_projections(p, scan)], sino,
+                    atol=1e-12)
+    assert_allclose(art(scan, sino, np.zeros((8, 8)), niter=2),
+                    art(probe, sino, np.zeros((8, 8)), niter=2))
+
+
+def test_photon_noise():
+    data = np.full((300, 400), 0.5)
+    noisy = photon_noise(data, flux=1e4, rng=np.random.default_rng(0))
+    # The variance of the log of Poisson counts is about 1 / counts.
+    counts = 1e4 * np.exp(-0.5)
+    assert_allclose(np.mean(noisy), 0.5, atol=1e-3)
+    assert_allclose(np.var(noisy), 1 / counts, rtol=0.05)
+
+    a = photon_noise(data, 1e3, gain=2, readout=3, rng=42)
+    b = photon_noise(data, 1e3, gain=2, readout=3, rng=42, workers=3)
+    assert_allclose(a, b)
+    assert photon_noise(np.zeros((0, 4)), 1e3).shape == (0, 4)
+
+
+def test_project_children_reached_through_parent():
+    p = Phantom()
+    parent = Phantom(geometry=Circle(Point([0.3, 0.5]), 0.2), mass_atten=1)
+    child = Phantom(geometry=Circle(Point([0.3, 0.5]), 0.1), mass_atten=1)
+    parent.append(child)
+    p.append(parent)
+    # Moving the child outside of its parent hides it from beams which miss
+    # the parent.
+    child.translate([0.4, 0])
+
+    compiled = p.compiled
+    assert_equal(compiled.kind, [compiled.CIRCLE] * 2)
+    assert_equal(compiled.parent, [-1, 0])
+    assert_equal(compiled.depth, [0, 1])
+
+    sino, _ = sinogram(4, 32, p)
+    scan = raster_scan(4, 32)
+    reference = np.array([next(scan).measure(p) for i in range(128)])
+    assert_allclose(sino, reference.reshape(4, 32), rtol=1e-8, atol=1e-14)
+
+
+def test_projection_cache_updates_changed_children():
+    np.random.seed(0)
+    p = Phantom(geometry=Circle(Point([0.5, 0.5]), 0.5), mass_atten=0.1)
+    p.sprinkle(20, 0.03, mass_atten=1)
+    p.children[3].append(Phantom(geometry=Circle(p.children[3].center, 0.01),
+                                 mass_atten=-1))
+    scan = Scan.raster(8, 32)
+    cache = ProjectionCache(p, scan)
+    assert_allclose(cache.data, project(p, scan), atol=1e-12)
+
+    p.children[3].translate([0.01, -0.02])
+    p.children[5].rotate(0.5)
+    p.pop(7)
+    p.append(Phantom(geometry=Circle(Point([0.5, 0.5]), 0.02), mass_atten=3))
+    assert_allclose(cache.update(), project(p, scan), atol=1e-12)
+
+    p.children[0].geometry.radius = 0.01
+    cache.refresh(p.children[0])
+    assert_allclose(cache.data, project(p, scan), atol=1e-12)
+
+    p.mass_atten = 0.2
+    assert_allclose(cache.update(), project(p, scan), atol=1e-12)
+
+
+def test_projection_cache_recurses_into_changed_descendants():
+    np.random.seed(0)
+    p = Phantom(geometry=Circle(Point([0.5, 0.5]), 0.5), mass_atten=0.1)
+    group = Phantom(geometry=Circle(Point([0.5, 0.5]), 0.3), mass_atten=0.5)
+    p.append(group)
+    group.sprinkle(10, 0.04, mass_atten=1)
+    inner = group.children[2]
+    inner.append(Phantom(geometry=Circle(Point([inner.center.x,
+                                                inner.center.y]), 0.01),
+                         mass_atten=-1))
+    p.append(Phantom(geometry=Circle(Point([0.15, 0.5]), 0.05), mass_atten=2))
+    scan = Scan.raster(8, 32)
+    cache = ProjectionCache(p, scan)
+
+    group.children[0].translate([0.01, 0])
+    assert_allclose(cache.update(), project(p, scan), atol=1e-12)
+    assert id(group.children[0]) in cache._parts
+
+    inner.children[0].translate([0, 0.005])
+    group.pop(5)
+    assert_allclose(cache.update(), project(p, scan), atol=1e-12)
+    assert id(inner.children[0]) in cache._parts
+
+    moved = group.pop(1)
+    p.append(moved)
+    assert_allclose(cache.update(), project(p, scan), atol=1e-12)
+
+    # Direct edits are only found by refresh.
+    group.geometry.radius = 0.35
+    assert_allclose(cache.refresh(), project(p, scan), atol=1e-12)
+    assert id(group.children[0]) not in cache._parts
+
+
+def test_projection_matrix():
+    size = 12
+    for sx in (6, 5):
+        A = projection_matrix(sx, 16, size)
+        assert A.shape == (sx * 16, size * size)
+
+        # The pixels tile the unit square.
+        p = Phantom(geometry=Square(Point([0.5, 0.5]), 1), mass_atten=1)
+        sino, probe = sinogram(sx, 16, p)
+        assert_allclose(A.dot(np.ones(size * size)), sino.ravel(), atol=1e-12)
+
+        np.random.seed(0)
+        for row, col in np.random.randint(0, A.shape, (50, 2)):
+            iy, ix = divmod(col, size)
+            pixel = Square(Point([(ix + 0.5) / size, (iy + 0.5) / size]),
+                           1 / size)
+            x = probe.history[row]
+            beam = Beam(Point(x[0:2]), Point(x[2:4]), 1 / 16)
+            assert_allclose(A[row, col], beampoly(beam, pixel), atol=1e-12)
+
+    B = projection_matrix(6, 16, size, workers=2)
+    assert_equal(B.toarray(), projection_matrix(6, 16, size).toarray())
+
+
+def test_sinogram_cache():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        cache = SinogramCache(tmpdir, max_bytes=None)
+        p = XDesignDefault()
+        sino, _ = sinogram(8, 16, p, noise=0.1, seed=3, cache=cache)
+        assert len(os.listdir(tmpdir)) == 1
+
+        # An identical phantom built separately hits the same entry.
+        cached, _ = sinogram(8, 16, XDesignDefault(), noise=0.1, seed=3,
+                             cache=cache)
+        assert_equal(cached, sino)
+        assert len(os.listdir(tmpdir)) == 1
+
+        # Changes to the phantom, scan, or seed miss it.
+        p.children[0].translate([0.01, 0])
+        sinogram(8, 16, p, noise=0.1, seed=3, cache=cache)
+        sinogram(8, 16, p, noise=0.1, seed=4, cache=cache)
+        angleogram(8, 16, p, noise=0.1, seed=4, cache=cache)
+        # Unseeded noise is not cached.
+        sinogram(8, 16, p, noise=0.1, cache=cache)
+        assert len(os.listdir(tmpdir)) == 4
+
+        # Only the most recently used entry fits the cap.
+        key = cache.key(XDesignDefault(), 'sinogram', (8, 16), 0.1, 3)
+        cache.max_bytes = os.path.getsize(os.path.join(tmpdir, key + '.npz'))
+        assert_equal(cache.load(key), sino)
+        cache.store(key, sino)
+        assert os.listdir(tmpdir) == [key + '.npz']
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_project_stack():
+    np.random.seed(0)
+    stack = []
+    for i in range(3):
+        p = Phantom(geometry=Circle(Point([0.5, 0.5]), 0.5), mass_atten=0.1)
+        p.sprinkle(5, 0.05, mass_atten=1)
+        stack.append(p)
+    scan = Scan.raster(8, 16)
+    expected = np.array([project(p, scan) for p in stack])
+
+    assert_allclose(project_stack(stack, scan), expected)
+    assert_allclose(project_stack(iter(stack), scan, workers=2), expected)
+    out = np.empty((3, 8, 16))
+    assert project_stack(stack, scan, out=out) is out
+    assert_allclose(out, expected)
+    assert project_stack([], scan).shape == (0, 8, 16)
+
+
+def test_project_stack_workers_draw_slices_as_needed():
+    drawn = []
+
+    def phantoms():
+        for i in range(8):
+            drawn.append(i)
+            yield UnitCircle(radius=0.1 + 0.02 * i, mass_atten=1)
+
+    class Out(object):
+        ahead = []
+        data = np.empty((8, 2, 4))
+
+        def __len__(self):
+            return len(self.data)
+
+        def __setitem__(self, i, value):
+            self.ahead.append(len(drawn) - i)
+            self.data[i] = value
+
+    out = Out()
+    project_stack(phantoms(), Scan.raster(2, 4), workers=2, out=out)
+    assert max(out.ahead) <= 5
+    assert_allclose(out.data, project_stack(
+        [UnitCircle(radius=0.1 + 0.02 * i, mass_atten=1) for i in range(8)],
+        Scan.raster(2, 4)))
+
+
+def test_project_polychromatic():
+    bone, water = Material('Ca', 1.9), Material('H2O', 1.0)
+    energy = np.array([20., 40., 60.])
+    spectrum = np.array([1., 2., 1.])
+    attenuation = {bone: np.array([3., 1., 0.5]),
+                   water: np.array([0.8, 0.4, 0.3])}
+
+    p = Phantom(geometry=Circle(Point([0.5, 0.5]), 0.4), mass_atten=1,
+                material=water)
+    p.append(Phantom(geometry=Circle(Point([0.4, 0.5]), 0.1), mass_atten=2,
+                     material=bone))
+    p.append(Phantom(geometry=Circle(Point([0.6, 0.5]), 0.1), mass_atten=-1))
+    scan = Scan.raster(4, 16)
+    data = project_polychromatic(p, scan, energy, spectrum, attenuation)
+
+    # Beer-Lambert for each energy then sum the spectrum.
+    transmitted = 0
+    for e in range(energy.size):
+        p.mass_atten = attenuation[water][e]
+        p.children[0].mass_atten = 2 * attenuation[bone][e]
+        transmitted = transmitted + spectrum[e] * np.exp(-project(p, scan))
+    assert_allclose(data, -np.log(transmitted / np.sum(spectrum)))
+
+    # Without materials it is monochromatic.
+    q = XDesignDefault()
+    assert_allclose(project_polychromatic(q, scan, energy, spectrum),
+                    project(q, scan), atol=1e-12)
+
+    # Scans without beams measure nothing.
+    empty = Scan(np.empty((0, 4)), 0.1)
+    assert project_polychromatic(p, empty, energy, spectrum,
+                                 attenuation).shape == (0, )
+
+
+def test_project_areas():
+    p = XDesignDefault()
+    scan = Scan.raster(8, 32)
+    A, phantoms = project_areas(p, scan)
+    assert A.shape == (8 * 32, 5)
+    assert phantoms[0] is p
+    atten = [q.mass_atten for q in phantoms]
+    assert_allclose(A.dot(atten).reshape(8, 32), project(p, scan),
+                    atol=1e-12)
+    # The faces of the mesh are summed into one column.
+    for row in range(A.shape[0]):
+        x = scan.history[row]
+        beam = Beam(Point(x[0:2]), Point(x[2:4]), scan.size[row])
+        assert_allclose(A[row, 2], beamintersect(beam, p.children[1].geometry),
+                        atol=1e-12)
+    assert A[:, 2].nnz > 0
+
+
+def test_scan_parallel_and_cull():
+    p = XDesignDefault()
+    sx, sy = 8, 32
+    scan = Scan.parallel(np.pi / sx * np.arange(sx),
+                         (np.arange(sy) + 0.5) / sy - 0.5, 1 / sy)
+    assert scan.shape == (sx, sy)
+    assert_allclose(project(p, scan), project(p, Scan.raster(sx, sy)),
+                    atol=1e-12)
+
+    # Sparse views with per-angle detector offsets.
+    angles = np.array([0.1, 1.2, 2.9])
+    positions = np.linspace(-0.3, 0.3, 5) + angles[:, np.newaxis] / 10
+    scan = Scan.parallel(angles, positions, 0.02)
+    theta, offset = scan.theta, scan.offset
+    assert_allclose(np.cos(theta - angles[:, np.newaxis]), 1)
+    assert_allclose(offset, positions + 0.5 * (np.cos(theta) + np.sin(theta)))
+
+    # One detector position at every angle.
+    scan = Scan.parallel(angles, 0.1, 0.02)
+    assert scan.shape == (3, 1)
+    assert_allclose(scan.offset[:, 0],
+                    0.1 + 0.5 * (np.cos(angles) + np.sin(angles)))
+    assert_raises(ValueError, Scan.parallel, angles, np.zeros((3, 2, 2)), 1)
+
+    # The region of interest only needs the beams which reach it.
+    scan = Scan.raster(sx, sy)
+    roi, index = scan.cull([0.3, 0.5], 0.1)
+    assert len(index) < scan.size.size / 3
+    data = np.zeros(scan.shape)
+    data.flat[index] = project(p, roi)
+    full = project(p, scan)
+    assert_allclose(data.flat[index], full.flat[index], atol=1e-12)
+    inside = Phantom(geometry=Circle(Point([0.3, 0.5]), 0.1), mass_atten=1)
+    assert_allclose(project(inside, scan).flat[index].sum(),
+                    project(inside, scan).sum())
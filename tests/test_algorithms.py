@@ -0,0 +1,120 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import numpy as np
+
+from xdesign.acquisition import Scan, sinogram
+from xdesign.algorithms import (Projector, siddon, fbp, art, sirt, mlem,
+                                os_sirt, osem, ordered_subsets)
+from xdesign.geometry import Circle, Point
+from xdesign.material import DogaCircles
+from xdesign.phantom import Phantom
+from numpy.testing import assert_allclose, assert_equal, assert_raises
+
+
+def test_projector_lengths():
+    scan = Scan.raster(4, 8)
+    projector = Projector(scan, (8, 8))
+    assert projector.matrix.shape == (32, 64)
+    # Every ray crosses the unit square.
+    assert_allclose(projector.forward(np.ones((8, 8)))[:8], 1)
+    assert np.all(projector.forward(np.ones((8, 8))) > 0)
+    # The vertical rays at angle 0 cross one column of pixels each.
+    image = np.zeros((8, 8))
+    image[2, :] = 1
+    assert_allclose(projector.forward(image)[:8], np.eye(8)[2])
+    assert_allclose(projector.back(np.ones(32)).sum(),
+                    projector.matrix.sum())
+
+
+def test_siddon():
+    endpoints = np.array([[-1, -1, 2, 2],       # the diagonal
+                          [0.3, -1, 0.3, 2],    # vertical
+                          [2, 0.7, -1, 0.7],    # horizontal, backwards
+                          [2, 2, 3, 3]])        # misses the grid
+    indptr, ix, iy, dist = siddon(endpoints, 4, chunk=10)
+    assert_equal(indptr, [0, 4, 8, 12, 12])
+    assert_equal(ix[:4], iy[:4])
+    assert_allclose(dist[:4], np.sqrt(2) / 4)
+    assert_equal(ix[4:8], 1)
+    assert_equal(iy[4:8], [0, 1, 2, 3])
+    assert_equal(ix[8:12], [3, 2, 1, 0])
+    assert_equal(iy[8:12], 2)
+    assert_allclose(dist[4:], 0.25)
+
+
+def test_solvers_share_projector():
+    p = DogaCircles(n_sizes=3, size_ratio=0.5, n_shuffles=0)
+    sino, probe = sinogram(8, 16, p)
+    projector = Projector(probe, (16, 16))
+    for solver in (art, sirt, mlem):
+        init = np.full((16, 16), 0.1)
+        assert_equal(solver(projector, sino, init.copy(), niter=2),
+                     solver(probe, sino, init.copy(), niter=2))
+    # A few iterations of ART nearly match the data.
+    recon = art(projector, sino, np.zeros((16, 16)), niter=20)
+    assert (np.linalg.norm(projector.forward(recon) - sino.ravel()) <
+            0.1 * np.linalg.norm(sino))
+
+
+def test_ordered_subsets():
+    order = [s[0] for s in ordered_subsets(16, 8)]
+    assert_equal(order, [0, 4, 2, 6, 1, 5, 3, 7])
+    order = [s[0] for s in ordered_subsets(16, 8, 'golden')]
+    assert_equal(order, [0, 5, 2, 7, 4, 1, 6, 3])
+    subsets = ordered_subsets(10, 3)
+    assert_equal(subsets[0], [0, 3, 6, 9])
+    assert_equal(np.sort(np.concatenate(subsets)), np.arange(10))
+    assert len(ordered_subsets(2, 8)) == 2
+
+
+def test_ordered_subsets_converge_faster():
+    p = DogaCircles(n_sizes=3, size_ratio=0.5, n_shuffles=0)
+    sino, probe = sinogram(32, 32, p)
+    projector = Projector(probe, (32, 32))
+    init = np.full((32, 32), 0.01)
+    for solver, os_solver, scale in ((sirt, os_sirt, 1), (mlem, osem, 32)):
+        full = solver(projector, sino, init.copy(), niter=3)
+        assert_allclose(os_solver(projector, sino, init.copy(), niter=3,
+                                  subsets=1), full)
+
+        def residual(x):
+            return np.linalg.norm(projector.forward(x) * scale - sino.ravel())
+        for order in ('bit-reversed', 'golden'):
+            x = os_solver(projector, sino, init.copy(), niter=3, subsets=8,
+                          order=order)
+            assert residual(x) < residual(full) / 4
+
+
+def test_threads():
+    p = DogaCircles(n_sizes=3, size_ratio=0.5, n_shuffles=0)
+    sino, probe = sinogram(16, 16, p)
+    projector = Projector(probe, (16, 16))
+    image = np.random.RandomState(0).rand(16, 16)
+    assert_allclose(projector.forward(image, threads=3),
+                    projector.forward(image))
+    assert_allclose(projector.back(sino.ravel(), threads=3),
+                    projector.back(sino.ravel()))
+    for solver in (sirt, mlem, os_sirt, osem):
+        init = np.full((16, 16), 0.1)
+        assert_allclose(solver(projector, sino, init.copy(), niter=2,
+                               threads=4),
+                        solver(projector, sino, init.copy(), niter=2))
+
+
+def test_fbp():
+    p = Phantom(geometry=Circle(Point([0.5, 0.5]), 0.3), mass_atten=1)
+    p.append(Phantom(geometry=Circle(Point([0.6, 0.5]), 0.1), mass_atten=1))
+    sino, probe = sinogram(90, 64, p)
+    projector = Projector(probe, (64, 64))
+    for filter in ('ramlak', 'shepp-logan', 'hann'):
+        recon = fbp(sino, filter=filter)
+        # Same units as art: the pixels are mass_atten / sy.
+        assert_allclose(recon[38, 32] * 64, 2, atol=0.02)
+        assert_allclose(recon[25, 45] * 64, 1, atol=0.05)
+        assert_allclose(recon[2, 2] * 64, 0, atol=0.05)
+        assert (np.linalg.norm(projector.forward(recon) - sino.ravel()) <
+                0.03 * np.linalg.norm(sino))
+    assert fbp(sino, size=32).shape == (32, 32)
+    assert_allclose(fbp(sino, size=32)[19, 16] * 64, 2, atol=0.05)
+    assert_raises(ValueError, fbp, sino, filter='cosine')
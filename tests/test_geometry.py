@@ -50,9 +50,12 @@ from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 
 from xdesign.geometry import *
-from xdesign.acquisition import beamcirc, beampoly
+from xdesign.geometry import halfspacecirc, BoundingVolumeHierarchy
+from xdesign.acquisition import beamcirc, beamcircs, beampoly, beampolys
+from xdesign.acquisition import beamintersect, beamsuperellipse
 from xdesign.acquisition import *
 from numpy.testing import assert_allclose, assert_raises, assert_equal
+from xdesign.phantom import Phantom
 import numpy as np
 
 
@@ -228,6 +231,145 @@ def test_beampoly_vertical_intersection():
     assert_allclose(beampoly(beam, tri), 1, rtol=1e-6)
 
 
+# Many beams
+
+def test_beamcircs_matches_beamcirc():
+    np.random.seed(0)
+    theta = np.random.uniform(0, 2 * np.pi, 50)
+    offset = np.random.uniform(-1, 1, 50)
+    size = np.random.uniform(0, 1, 50)
+    circles = [Circle(Point(np.random.uniform(-1, 1, 2)), r)
+               for r in np.random.uniform(0, 1, 20)]
+
+    areas = beamcircs(theta, offset, size, circles)
+    assert_equal(areas.shape, (50, 20))
+
+    for i in range(50):
+        normal = np.array([np.cos(theta[i]), np.sin(theta[i])])
+        tangent = np.array([-normal[1], normal[0]])
+        beam = Beam(Point(normal * offset[i] - tangent),
+                    Point(normal * offset[i] + tangent), size[i])
+        for j in range(20):
+            assert_allclose(areas[i, j], beamcirc(beam, circles[j]),
+                            rtol=1e-9, atol=1e-12)
+
+    assert_allclose(beamcircs(theta, offset, size, circles[3]), areas[:, 3])
+
+
+def test_beampolys_partition_polygon():
+    polygons = [Triangle(Point([0.1, 0.2]), Point([0.9, 0.3]),
+                         Point([0.4, 0.8])),
+                Square(Point([0.5, 0.5]), 0.4),
+                Polygon([Point([0.2, 0.2]), Point([0.6, 0.1]),
+                         Point([0.8, 0.5]), Point([0.5, 0.9]),
+                         Point([0.1, 0.6])])]
+    polygons[1].rotate(0.3, Point([0.5, 0.5]))
+
+    # adjacent beams which cover the plane sum to the area of the polygon
+    for theta in [0, 0.1, np.pi / 4, 2]:
+        offset = np.linspace(-2, 2, 401)
+        areas = beampolys(theta, offset, 0.01, polygons)
+        assert_allclose(np.sum(areas, axis=0),
+                        [p.area for p in polygons[:2]] + [0.35],
+                        rtol=1e-12)
+
+
+def test_beampolys_square():
+    square = Rectangle(Point([0, 0]), Point([1, 0]), Point([1, 1]),
+                       Point([0, 1]))
+    offset = np.array([-1, 0, 0.25, 0.5, 0.9, 1.5])
+    assert_allclose(beampolys(0, offset, 0.5, square),
+                    [0, 0.25, 0.5, 0.5, 0.35, 0], atol=1e-15)
+    assert_allclose(beampolys(np.pi / 2, offset, 0.5, [square])[:, 0],
+                    [0, 0.25, 0.5, 0.5, 0.35, 0], atol=1e-15)
+
+
+def test_beamsuperellipse_partition_superellipse():
+    theta, offset = np.meshgrid([0, 0.3, np.pi / 4, 2],
+                                np.linspace(-2, 2, 401))
+    for n in [0.3, 0.5, 0.9, 1, 1.0001, 1.001, 1.5, 2, 4, 30]:
+        p = Phantom(geometry=Superellipse(Point([0.3, -0.2]), 0.5, 0.2, n),
+                    mass_atten=1)
+        areas = project(p, theta, offset, 0.01)
+        assert_allclose(np.sum(areas, axis=0), p.geometry.area, rtol=1e-12)
+
+        beam = Beam(Point([0.3, -1]), Point([0.25, 1]), 0.07)
+        normal = beam.normal._x
+        assert_allclose(beamintersect(beam, p.geometry),
+                        project(p, np.arctan2(normal[1], normal[0]),
+                                normal.dot(beam.p1._x), 0.07))
+
+
+def test_beamsuperellipse_star_approaches_diamond():
+    # Below n = 1 the shapes are not convex; they approach the diamond.
+    for theta in [0.1, 0.7, 2.5]:
+        offset = np.linspace(-0.6, 0.8, 29)
+        star = Phantom(geometry=Superellipse(Point([0.3, -0.2]), 0.5, 0.2,
+                                             1 - 1e-10), mass_atten=1)
+        diamond = Phantom(geometry=Superellipse(Point([0.3, -0.2]), 0.5, 0.2,
+                                                1), mass_atten=1)
+        assert_allclose(project(star, theta, offset, 0.07),
+                        project(diamond, theta, offset, 0.07), atol=1e-8)
+
+
+def test_beamsuperellipse_round_ellipse():
+    beam = Beam(Point([0.2, -1]), Point([0.35, 1]), 0.1)
+    ellipse = Ellipse(Point([0.1, 0.2]), 0.3, 0.3)
+    assert_allclose(beamsuperellipse(beam, ellipse),
+                    beamcirc(beam, Circle(Point([0.1, 0.2]), 0.3)))
+
+    # Stretching the plane stretches the intersection by the same factor.
+    beam = Beam(Point([0.2, -1]), Point([0.2, 1]), 0.1)
+    ellipse = Ellipse(Point([0.1, 0.2]), 0.6, 0.3)
+    assert_allclose(beamsuperellipse(beam, ellipse),
+                    2 * beamcirc(Beam(Point([0.1, -1]), Point([0.1, 1]),
+                                      0.05),
+                                 Circle(Point([0.05, 0.2]), 0.3)))
+
+
+def test_Superellipse_contains():
+    outer = Ellipse(Point([0.5, 0.5]), 0.4, 0.3)
+    assert outer.contains(Ellipse(Point([0.5, 0.5]), 0.39, 0.29))
+    assert not outer.contains(Ellipse(Point([0.5, 0.5]), 0.41, 0.1))
+    assert outer.contains(Circle(Point([0.6, 0.5]), 0.2))
+    assert not outer.contains(Circle(Point([0.5, 0.5]), 0.31))
+    assert_equal(outer.contains(np.array([[0.89, 0.5], [0.8, 0.7]])),
+                 [True, False])
+
+    square = Square(Point([0.5, 0.5]), 1)
+    assert square.contains(Superellipse(Point([0.5, 0.5]), 0.49, 0.4, 8))
+    assert not square.contains(Superellipse(Point([0.5, 0.5]), 0.51, 0.2,
+                                            8))
+
+
+def test_halfspacecirc_array():
+    d = np.array([0, 0.5, 1, 2])
+    assert_allclose(halfspacecirc(d, 1),
+                    [halfspacecirc(x, 1) for x in d])
+    assert_allclose(halfspacecirc(0, np.array([1, 2])), [0.5, 0.5])
+
+
+def test_BoundingVolumeHierarchy_query():
+    np.random.seed(0)
+    center = np.random.uniform(0, 1, (100, 2))
+    radius = np.random.uniform(0, 0.05, 100)
+    radius[7] = np.inf
+    bvh = BoundingVolumeHierarchy(center, radius)
+
+    theta = np.random.uniform(0, np.pi, 30)
+    normal = np.stack([np.cos(theta), np.sin(theta)], axis=1)
+    offset = np.random.uniform(0, 1, 30)
+    width = np.random.uniform(0, 0.1, 30)
+
+    strips, circles = bvh.query(normal, offset, width)
+    hits = set(zip(strips, circles))
+    assert_equal(len(hits), strips.size)
+
+    brute = (np.abs(normal.dot(center.T) - offset[:, np.newaxis]) <=
+             radius + width[:, np.newaxis])
+    assert_equal(hits, set(zip(*np.nonzero(brute))))
+
+
 # Line
 
 def test_Line_slope_vertical():
@@ -62,10 +62,21 @@ from __future__ import (absolute_import, division, print_function,
 
 import numpy as np
 from xdesign.geometry import *
-from xdesign.geometry import halfspacecirc
+from xdesign.geometry import (halfspacecirc, _bounding_circle,
+                              _polygon_vertices)
+from xdesign.phantom import Phantom
+from scipy import sparse, special
 import logging
 import polytope as pt
 from copy import copy
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import functools
+import hashlib
+import json
+import os
+import tempfile
+import zipfile
 from cached_property import cached_property
 
 logger = logging.getLogger(__name__)
@@ -76,8 +87,20 @@ __copyright__ = "Copyright (c) 2016, UChicago Argonne, LLC."
 __docformat__ = 'restructuredtext en'
 __all__ = ['Beam',
            'Probe',
+           'Scan',
+           'ProjectionCache',
+           'SinogramCache',
+           'project',
+           'project_areas',
+           'project_stack',
+           'project_polychromatic',
            'sinogram',
            'angleogram',
+           'create_sinogram_file',
+           'load_sinogram_file',
+           'iter_projections',
+           'photon_noise',
+           'projection_matrix',
            'raster_scan',
            'angle_scan']
 
@@ -184,6 +207,8 @@ def beamintersect(beam, geometry):
         return beampoly(beam, geometry)
     elif isinstance(geometry, Circle):
         return beamcirc(beam, geometry)
+    elif isinstance(geometry, Superellipse):
+        return beamsuperellipse(beam, geometry)
     else:
         raise NotImplementedError
 
@@ -194,7 +219,9 @@ def beammesh(beam, mesh):
         logger.info("BEAMMESH skipped because of radius.")
         return 0
 
-    return beam.half_space.intersect(mesh.half_space).volume
+    normal, offset, size = _beam_to_arrays(beam)
+    return np.sum(_beampoly_array(normal, offset, size,
+                                  _polygon_vertices(mesh.faces)))
 
 
 def beampoly(beam, poly):
@@ -203,7 +230,15 @@ def beampoly(beam, poly):
         logger.info("BEAMPOLY skipped because of radius.")
         return 0
 
-    return beam.half_space.intersect(poly.half_space).volume
+    normal, offset, size = _beam_to_arrays(beam)
+    return _beampoly_array(normal, offset, size, poly.numpy)[0]
+
+
+def _beam_to_arrays(beam):
+    """Return the normal, offset, and size arrays of a single Beam."""
+    normal = beam.normal._x
+    return (normal[np.newaxis, :], np.array([normal.dot(beam.p1._x)]),
+            np.array([beam.size]))
 
 
 def beamcirc(beam, circle):
@@ -251,6 +286,29 @@ def beamcirc(beam, circle):
     return a
 
 
+def beamsuperellipse(beam, superellipse):
+    """Intersection area of an infinite beam with a Superellipse or Ellipse
+
+    Parameters
+    ----------
+    beam : Beam
+    superellipse : Superellipse
+
+    Returns
+    -------
+    a : scalar
+        Area of the intersected region.
+    """
+    if beam.distance(superellipse.center) > superellipse.radius:
+        logger.info("BEAMSUPERELLIPSE skipped because of radius.")
+        return 0
+
+    normal, offset, size = _beam_to_arrays(beam)
+    return _beamsuperellipse_array(normal, offset, size,
+                                   superellipse.center._x, superellipse.a,
+                                   superellipse.b, superellipse.n)[0]
+
+
 class Probe(Beam):
     """An object for probing Phantoms.
 
@@ -260,9 +318,26 @@ class Probe(Beam):
     """
     # TODO: Implement additional attributes for Probe such as beam energy,
     # brightness, wavelength, etc.
-    def __init__(self, p1, p2, size=0):
+    def __init__(self, p1, p2, size=0, spill=None, spill_dir=None):
+        """
+        Parameters
+        ----------
+        p1, p2 : Point
+            End points of the beam.
+        size : scalar, optional
+            The width of the beam.
+        spill : int, optional
+            Once the history holds more than this many positions, it is moved
+            to a memory-mapped temporary file. By default the history is
+            always kept in memory.
+        spill_dir : str, optional
+            The directory for the memory-mapped history file.
+        """
         super(Probe, self).__init__(p1, p2, size)
-        self.history = []
+        self.spill = spill
+        self.spill_dir = spill_dir
+        self._history = np.empty((0, 4))
+        self._nhistory = 0
 
     def __repr__(self):
         return "Probe({}, {}, size={})".format(repr(self.p1), repr(self.p2),
@@ -276,6 +351,10 @@ class Probe(Beam):
     def measure(self, phantom, sigma=0):
         """Return the probe measurement with optional Gaussian noise.
 
+        The bounding volume hierarchies of the phantom are not checked for
+        direct edits on every measurement; call :meth:`.Phantom.refresh`
+        after editing the geometry of a descendant in place.
+
         Parameters
         ----------
         sigma : float >= 0
@@ -296,17 +375,1435 @@ class Probe(Beam):
         else:
             newdata = 0
 
-        if intersection > 0:
-            for child in phantom.children:
-                newdata += self._measure_helper(child)
+        # Phantoms without geometry are containers; always check children.
+        if (intersection is None or intersection > 0) and phantom.children:
+            normal = self.normal._x
+            _, candidates = phantom.bvh.query(normal, normal.dot(self.p1._x),
+                                              self.size / 2)
+            for i in np.sort(candidates):
+                newdata += self._measure_helper(phantom.children[i])
 
         return newdata
 
+    @property
+    def history(self):
+        """An (N, 4) view of the recorded beam positions.
+
+        Each row is [x1, y1, x2, y2], the end points of the beam at the time
+        of one measurement. The view shares memory with the internal buffer,
+        so copy it before calling :meth:`record` again if it must be kept.
+        """
+        return self._history[:self._nhistory]
+
+    @history.setter
+    def history(self, positions):
+        positions = np.asarray(positions, dtype=float).reshape(-1, 4)
+        self._nhistory = 0
+        self._reserve(positions.shape[0])
+        self._history[:positions.shape[0]] = positions
+        self._nhistory = positions.shape[0]
+
     def record(self):
-        self.history.append(self.list)
+        """Append the current beam position to the history."""
+        if self._nhistory == self._history.shape[0]:
+            self._reserve(max(2 * self._nhistory, 16))
+        self._history[self._nhistory] = self.list
+        self._nhistory += 1
+
+    def _reserve(self, capacity):
+        """Grow the history buffer to hold at least capacity positions."""
+        if capacity <= self._history.shape[0]:
+            return
+        if self.spill is not None and capacity > self.spill:
+            # TemporaryFile is unlinked on creation; the mapping keeps the
+            # data alive until the buffer is garbage collected.
+            with tempfile.TemporaryFile(dir=self.spill_dir) as f:
+                f.truncate(capacity * 4 * np.dtype(float).itemsize)
+                buffer = np.memmap(f, dtype=float, mode='r+',
+                                   shape=(capacity, 4))
+        else:
+            buffer = np.empty((capacity, 4))
+        buffer[:self._nhistory] = self._history[:self._nhistory]
+        self._history = buffer
+
+
+class _ScanProbe(Probe):
+    """A Probe at the last position of a closed-form scan.
+
+    The history is the (sx * sy, 4) positions endpoints(sx, sy) of the scan;
+    it is computed when it is first used.
+    """
+    def __init__(self, endpoints, sx, sy, size):
+        last = endpoints(sx, sy, [sx - 1])[-1]
+        super(_ScanProbe, self).__init__(Point(last[0:2]), Point(last[2:4]),
+                                         size)
+        self._positions = functools.partial(endpoints, sx, sy)
+
+    @property
+    def history(self):
+        if self._positions is not None:
+            self.history = self._positions()
+        return Probe.history.fget(self)
+
+    @history.setter
+    def history(self, positions):
+        Probe.history.fset(self, positions)
+        self._positions = None
+
+    def record(self):
+        self.history
+        super(_ScanProbe, self).record()
+
+
+class Scan(object):
+    """A fixed sequence of beam positions.
+
+    Unlike the generators :func:`raster_scan` and :func:`angle_scan`, which
+    move a single Probe from one position to the next, a Scan stores every
+    position at once. It can be measured by :func:`project` and passed in
+    place of a Probe to the reconstruction algorithms.
+
+    Attributes
+    ----------
+    endpoints : ndarray
+        The (N, 2, 2) end points of the beams; endpoints[i, j] is the jth end
+        point of the ith beam.
+    size : ndarray
+        The (N, ) sizes of the beams.
+    shape : tuple
+        The shape of the measurements. i.e. (sx, sy) for a sinogram.
+    """
+    def __init__(self, endpoints, size=0, shape=None):
+        endpoints = np.array(endpoints, dtype=float).reshape(-1, 2, 2)
+        self.endpoints = endpoints
+        self.size = np.array(np.broadcast_to(size, endpoints.shape[0]),
+                             dtype=float)
+        if shape is None:
+            shape = (endpoints.shape[0], )
+        self.shape = tuple(shape)
+        if np.prod(self.shape, dtype=int) != endpoints.shape[0]:
+            raise ValueError("A Scan of {} beams cannot have shape {}.".format(
+                             endpoints.shape[0], self.shape))
+
+    @classmethod
+    def raster(cls, sx, sy):
+        """Return the Scan of :func:`raster_scan`.
+
+        Parameters
+        ----------
+        sx : int
+            Number of rotation angles.
+        sy : int
+            Number of detection pixels (or sample translations).
+        """
+        return cls(_raster_endpoints(sx, sy), 1. / sy, (sx, sy))
+
+    @classmethod
+    def angle(cls, sx, sy):
+        """Return the Scan of :func:`angle_scan`.
+
+        Parameters
+        ----------
+        sx : int
+            Number of rotation angles.
+        sy : int
+            Number of detection pixels (or sample translations).
+        """
+        return cls(_angle_endpoints(sx, sy), 0.1 / sy, (sx, sy))
+
+    @classmethod
+    def parallel(cls, angles, positions, size, center=(0.5, 0.5)):
+        """Return a Scan of parallel beams at any angles and positions.
+
+        At each angle, the beams are first placed vertically at positions
+        along the x-axis relative to center and then rotated by the angle
+        around center like :func:`raster_scan`. So Scan.raster(sx, sy) is the
+        same as Scan.parallel(np.pi / sx * np.arange(sx), (np.arange(sy) +
+        0.5) / sy - 0.5, 1 / sy) except for where its end points lie along
+        each beam.
+
+        Parameters
+        ----------
+        angles : ndarray
+            The (A, ) rotation angles in radians; e.g. a sparse or irregular
+            set of views.
+        positions : ndarray or scalar
+            The (D, ) positions of the beams at every angle or the (A, D)
+            positions at each angle; e.g. a subset of the detector pixels or
+            positions which move with the angle. A scalar is one position
+            at every angle.
+        size : scalar
+            The size of the beams.
+        center : (2, ) array-like, optional
+            The center of rotation.
+
+        Returns
+        -------
+        scan : Scan
+            A Scan with shape (A, D).
+        """
+        angles = np.atleast_1d(angles).astype(float)
+        positions = np.atleast_1d(positions)
+        if angles.ndim != 1 or positions.ndim > 2:
+            raise ValueError("angles must be 1-D and positions must be 0-D, "
+                             "1-D, or 2-D.")
+        positions = np.broadcast_to(positions, angles.shape +
+                                    positions.shape[-1:])
+        center = np.asarray(center, dtype=float)
+
+        points = np.empty(positions.shape + (2, 2))
+        points[..., 0] = center[0] + positions[..., np.newaxis]
+        points[..., 1] = center[1] + np.array([-10, 10])
+        points = _rotate(points, angles[:, np.newaxis, np.newaxis], center)
+        return cls(points, size, positions.shape)
+
+    def cull(self, center, radius):
+        """Return the beams which intersect a circular region of interest.
+
+        The beams whose strips miss the circle are dropped without measuring
+        anything, so only the rays which can see the region are projected.
+
+        Parameters
+        ----------
+        center : (2, ) array-like
+            The center of the region of interest.
+        radius : scalar
+            The radius of the region of interest.
+
+        Returns
+        -------
+        scan : Scan
+            The (K, ) remaining beams.
+        index : ndarray
+            The (K, ) flat index of each remaining beam in an array of
+            self.shape. e.g. ``data = np.zeros(self.shape)`` then
+            ``data.flat[index] = project(phantom, scan)``.
+        """
+        theta, offset = _endpoints_to_geometry(self.history)
+        distance = (np.cos(theta) * center[0] + np.sin(theta) * center[1] -
+                    offset)
+        index = np.flatnonzero(np.abs(distance) < radius + self.size / 2)
+        return (Scan(self.endpoints[index], self.size[index], index.shape),
+                index)
+
+    @classmethod
+    def load(cls, filename):
+        """Return a Scan saved with :meth:`save`."""
+        with np.load(filename) as f:
+            return cls(f['endpoints'], f['size'], f['shape'])
+
+    def save(self, filename):
+        """Save the Scan to a .npz file."""
+        np.savez_compressed(filename, endpoints=self.endpoints,
+                            size=self.size, shape=self.shape)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, index):
+        """Return the Scan of the beams at index of an array of self.shape."""
+        ids = np.arange(self.endpoints.shape[0]).reshape(self.shape)[index]
+        ids = np.asarray(ids)
+        return Scan(self.endpoints[ids.ravel()], self.size[ids.ravel()],
+                    ids.shape)
+
+    def __eq__(self, other):
+        return (isinstance(other, Scan) and self.shape == other.shape and
+                np.array_equal(self.endpoints, other.endpoints) and
+                np.array_equal(self.size, other.size))
+
+    def __ne__(self, other):
+        return not self == other
+
+    @property
+    def history(self):
+        """The (N, 4) beam positions [x1, y1, x2, y2] like Probe.history."""
+        return self.endpoints.reshape(-1, 4)
+
+    @property
+    def theta(self):
+        """The angles of the beam normals in the shape of the Scan."""
+        theta, _ = _endpoints_to_geometry(self.history)
+        return theta.reshape(self.shape)
+
+    @property
+    def offset(self):
+        """The distances from the origin to the beam centerlines."""
+        _, offset = _endpoints_to_geometry(self.history)
+        return offset.reshape(self.shape)
+
+    def probe(self):
+        """Return a Probe at the last position with the Scan as history."""
+        return _measured_probe(self.history, self.size[-1])
+
+
+class ProjectionCache(object):
+    """Measurements of a Phantom by a Scan which are updated incrementally.
+
+    The contribution of each child of the Phantom is stored separately on the
+    beams that it reaches. When :meth:`update` is called, only the children
+    which were appended, popped, or changed since the last update are measured
+    again; their old contributions are subtracted and the new ones are added.
+    Only the subtrees whose revision moved are visited, so an update costs
+    about as much as measuring the changed nodes.
+
+    A child whose own geometry and mass_atten are unchanged but whose
+    descendants changed is not measured again as a whole. Its own
+    contribution and those of its children are stored separately from then
+    on, and the update recurses into its children in the same way.
+
+    Direct edits of the geometry, mass_atten, or order of children of a
+    descendant do not move any revision, so :meth:`update` does not see
+    them; call :meth:`refresh` afterwards, which walks the whole Phantom
+    with :meth:`.Phantom.refresh`. Changes inside the material of a
+    descendant are only found by passing the changed child to
+    :meth:`refresh`.
+
+    Attributes
+    ----------
+    phantom : Phantom
+    scan : Scan
+    """
+    def __init__(self, phantom, scan):
+        self.phantom = phantom
+        self.scan = scan
+        self._theta = scan.theta.ravel()
+        self._offset = scan.offset.ravel()
+        self._size = scan.size
+        self._normal = np.stack([np.cos(self._theta), np.sin(self._theta)],
+                                axis=1)
+        self.rebuild()
+
+    @property
+    def data(self):
+        """The measurements in the shape of the Scan as of the last update."""
+        return self._data.reshape(self.scan.shape)
+
+    def rebuild(self):
+        """Measure the whole Phantom again and return the measurements."""
+        self._data = np.zeros(self._offset.size)
+        self._root = None
+        self._revision = None
+        self._parts = dict()
+        self._children = set()
+        return self.update()
+
+    def update(self):
+        """Measure the descendants which changed and return the measurements.
+        """
+        root = self.phantom
+        state = _own_state(root)
+        if self._root != state:
+            self._data[:] = 0
+            self._parts = dict()
+            self._children = set()
+            self._revision = None
+            _, _, self._reached = self._measure_own(
+                root, np.arange(self._offset.size))
+            self._root = state
+
+        if self._revision != root.revision:
+            self._children = self._update(root, self._children,
+                                          self._reached)
+            self._revision = root.revision
+        return self.data
+
+    def refresh(self, child=None):
+        """Find direct edits and return the measurements.
+
+        Without child, the whole Phantom is checked for direct edits with
+        :meth:`.Phantom.refresh` and then updated. Otherwise the given child
+        of the Phantom is measured again; the other cached properties of the
+        child and its ancestors, such as their bounding volume hierarchies,
+        are also reset.
+        """
+        if child is None:
+            self.phantom.refresh()
+            return self.update()
+        child._invalidate()
+        self._measure(child, self.phantom, self._reached)
+        self._children.add(id(child))
+        return self.data
+
+    def _update(self, parent, known, rays):
+        """Measure the children of parent which changed and return their ids.
+
+        known are the ids of the children at the last update and rays are the
+        beams which reach the children.
+        """
+        children = dict((id(child), child) for child in parent.children)
+        for key in known:
+            part = self._parts.get(key)
+            if key not in children and part is not None and \
+                    part.parent is parent:
+                self._remove(key)
+        for key, child in children.items():
+            part = self._parts.get(key)
+            if (part is not None and part.parent is parent and
+                    part.revision == child.revision):
+                continue
+            if (part is None or part.parent is not parent or
+                    part.state != _own_state(child)):
+                self._measure(child, parent, rays)
+            elif part.revision != child.revision:
+                self._split(part, rays)
+        return set(children)
+
+    def _measure(self, child, parent, rays):
+        """Replace the contribution of a child and all of its descendants."""
+        self._remove(id(child))
+
+        if child.geometry is not None:
+            center, radius = _bounding_circle(child.geometry)
+            distance = np.abs(self._normal[rays].dot(center) -
+                              self._offset[rays])
+            rays = rays[distance < radius + self._size[rays] / 2]
+
+        values = project(child, self._theta[rays], self._offset[rays],
+                         self._size[rays])
+        rays, values = rays[values != 0], values[values != 0]
+        self._data[rays] += values
+        self._parts[id(child)] = _Contribution(child, parent, rays, values)
+
+    def _split(self, part, rays):
+        """Update a child whose own geometry and mass_atten are unchanged by
+        measuring its children separately."""
+        node = part.node
+        if part.children is None:
+            self._remove(id(node))
+            hit, values, reached = self._measure_own(node, rays)
+            part = _Contribution(node, part.parent, hit, values)
+            part.children, part.reached = set(), reached
+            self._parts[id(node)] = part
+        part.children = self._update(node, part.children, part.reached)
+        part.revision = node.revision
+
+    def _measure_own(self, node, rays):
+        """Measure the geometry of node itself without children.
+
+        Returns the beams with nonzero measurements, the measurements, and
+        the beams of rays which reach the children of node.
+        """
+        if node.geometry is None:
+            return rays[:0], np.zeros(0), rays
+        center, radius = _bounding_circle(node.geometry)
+        distance = np.abs(self._normal[rays].dot(center) - self._offset[rays])
+        rays = rays[distance < radius + self._size[rays] / 2]
+
+        area = project(Phantom(geometry=node.geometry, mass_atten=1),
+                       self._theta[rays], self._offset[rays],
+                       self._size[rays])
+        rays, area = rays[area > 0], area[area > 0]
+        values = area * node.mass_atten
+        self._data[rays] += values
+        return rays, values, rays
+
+    def _remove(self, key):
+        """Subtract the contribution of the node with id key and of its
+        separately stored descendants."""
+        part = self._parts.pop(key, None)
+        if part is not None:
+            self._data[part.rays] -= part.values
+            for child in part.children or ():
+                self._remove(child)
+
+
+class _Contribution(object):
+    """The measurements of a node of a Phantom stored by
+    :class:`ProjectionCache`.
+
+    Attributes
+    ----------
+    node, parent : Phantom
+    state : tuple
+        The geometry and mass_atten of node when it was measured.
+    revision : int
+        The revision of node when it was last updated.
+    rays, values : ndarray
+        The beams with nonzero measurements and the measurements.
+    children : set
+        The ids of the children of node which are stored separately; None if
+        values include all of the descendants of node.
+    reached : ndarray
+        The beams which reach the children of node when they are stored
+        separately.
+    """
+    def __init__(self, node, parent, rays, values):
+        self.node = node
+        self.parent = parent
+        self.state = _own_state(node)
+        self.revision = node.revision
+        self.rays = rays
+        self.values = values
+        self.children = None
+        self.reached = None
+
+
+def _own_state(phantom):
+    """Return the parts of phantom which do not depend on its children."""
+    return (repr(phantom.geometry), phantom.mass_atten)
+
+
+class SinogramCache(object):
+    """A directory of simulated measurements keyed by what produced them.
+
+    Each entry is a compressed .npz file named by the SHA-256 hash of the
+    Phantom's content (its flattened geometry, mass_atten, and tree
+    structure), the kind of scan, its parameters, and the noise seed. So an
+    entry is reused by any job which simulates an identical Phantom, whether
+    it was built the same way or not.
+
+    Entries are written to a temporary file and moved into place, so
+    concurrent jobs sharing a directory never read partial entries. When the
+    directory grows beyond max_bytes, the least recently used entries are
+    removed.
+
+    Attributes
+    ----------
+    directory : str
+        The directory where entries are stored. Created if missing.
+    max_bytes : int, optional
+        The size cap of the directory. None for no cap.
+    """
+    def __init__(self, directory, max_bytes=2**30):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def key(self, phantom, *params):
+        """Return the hash of a Phantom and the parameters of its scan."""
+        h = hashlib.sha256()
+        h.update(json.dumps([repr(p) for p in params]).encode())
+        compiled = phantom.compiled
+        for array in (compiled.kind, compiled.params, compiled.polygon,
+                      compiled.vertices, compiled.node, compiled.parent,
+                      compiled.mass_atten):
+            array = np.ascontiguousarray(array)
+            h.update(str((array.dtype.str, array.shape)).encode())
+            h.update(array.tobytes())
+        return h.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.npz')
+
+    def load(self, key):
+        """Return the entry stored at key or None if there is none."""
+        path = self._path(key)
+        try:
+            with np.load(path) as f:
+                data = f['data']
+            os.utime(path, None)
+        except (IOError, OSError, KeyError, ValueError, zipfile.BadZipfile):
+            return None
+        return data
+
+    def store(self, key, data):
+        """Store data at key then evict entries beyond the size cap."""
+        f = tempfile.NamedTemporaryFile(dir=self.directory, suffix='.tmp',
+                                        delete=False)
+        try:
+            with f:
+                np.savez_compressed(f, data=np.asarray(data))
+            os.replace(f.name, self._path(key))
+        except BaseException:
+            os.remove(f.name)
+            raise
+        self._evict()
+
+    def _evict(self):
+        if self.max_bytes is None:
+            return
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.npz'):
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(e[1] for e in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+            total -= size
+
+
+def project(phantom, theta, offset=None, size=0):
+    """Return the measurements of many beams through a phantom at once.
+
+    Each beam is described by the angle of its unit normal, the signed
+    distance from the origin to its centerline along that normal, and its
+    size; or all three are taken from a :class:`Scan`. Instead of walking the
+    Phantom tree once for every beam, the tree is flattened once into a
+    :class:`.CompiledPhantom` whose primitives are measured by all of the
+    beams using array operations.
+
+    Parameters
+    ----------
+    phantom : Phantom
+    theta : ndarray or Scan
+        The angles of the beam normals from the x-axis in radians.
+    offset : ndarray
+        The signed distances from the origin to the beam centerlines.
+    size : ndarray or scalar, optional
+        The sizes of the beams. i.e. the diameters
+
+    Returns
+    -------
+    data : ndarray
+        The measurements; the broadcasted shape of theta, offset, and size or
+        the shape of the Scan.
+    """
+    shape, normal, offset, size = _beam_arrays(theta, offset, size)
+    data = np.zeros(offset.size)
+    _project_compiled(phantom.compiled, normal, offset, size, data)
+    return data.reshape(shape)
+
+
+def project_areas(phantom, theta, offset=None, size=0):
+    """Return the intersection area of every beam with every node.
+
+    The nodes are the Phantom and its descendants which have geometry, in
+    the order of :attr:`.CompiledPhantom.phantoms`. The area of a node only
+    counts where the beam reaches it, like in :func:`project`, so any model
+    of attenuation which weights the nodes is a product with this matrix.
+    For example, ``A.dot([p.mass_atten for p in phantoms])`` is the raveled
+    output of :func:`project`.
+
+    Parameters
+    ----------
+    phantom : Phantom
+    theta, offset, size
+        The beams as for :func:`project`.
+
+    Returns
+    -------
+    A : scipy.sparse.csr_matrix
+        The (beams, nodes) intersection areas; beams are raveled in the
+        broadcasted shape of theta, offset, and size or the shape of the Scan.
+    phantoms : list
+        The Phantom of each column.
+    """
+    shape, normal, offset, size = _beam_arrays(theta, offset, size)
+    compiled = phantom.compiled
+    rays = [np.zeros(0, dtype=int)]
+    nodes = [np.zeros(0, dtype=int)]
+    areas = [np.zeros(0)]
+    for r, pr, pp, area in _compiled_pairs(compiled, normal, offset, size):
+        m = area > 0
+        rays.append(r[pr[m]])
+        nodes.append(compiled.node[pp[m]])
+        areas.append(area[m])
+    A = sparse.csr_matrix((np.concatenate(areas), (np.concatenate(rays),
+                                                   np.concatenate(nodes))),
+                          shape=(offset.size, len(compiled.phantoms)))
+    return A, compiled.phantoms
+
+
+def _beam_arrays(theta, offset, size):
+    """Return the shape and the raveled normals, offsets, and sizes of beams
+    described as for :func:`project`."""
+    if isinstance(theta, Scan):
+        scan = theta
+        theta, offset = scan.theta, scan.offset
+        size = scan.size.reshape(scan.shape)
+    theta, offset, size = np.broadcast_arrays(theta, offset, size)
+    shape = theta.shape
+    theta = np.ravel(theta).astype(float)
+    normal = np.stack([np.cos(theta), np.sin(theta)], axis=1)
+    offset = np.ravel(offset).astype(float)
+    size = np.ravel(size).astype(float)
+    return shape, normal, offset, size
+
+
+def _project_compiled(compiled, normal, offset, size, data, weight=None):
+    """Add the measurements of a CompiledPhantom to data.
+
+    If weight is given, it is a (P, K) array which replaces mass_atten as
+    the weights of the primitives, and the K weighted sums are added to the
+    columns of a (N, K) data.
+    """
+    if weight is None:
+        weight = compiled.mass_atten[:, np.newaxis]
+        data = data[:, np.newaxis]
+    for r, pr, pp, area in _compiled_pairs(compiled, normal, offset, size):
+        for k in range(weight.shape[1]):
+            data[r, k] += np.bincount(pr, area * weight[pp, k],
+                                      minlength=r.size)
+
+
+def _compiled_pairs(compiled, normal, offset, size):
+    """Yield the intersection areas of the beams and the primitives in chunks.
+
+    The bounding volume hierarchy of the primitives culls the (beam,
+    primitive) pairs which cannot intersect, then the areas of all remaining
+    pairs of one kind of primitive are computed by one call to the array
+    kernel for that shape. Like :meth:`Probe._measure_helper`, a primitive
+    only counts for a beam if the beam intersects every ancestor node with
+    geometry; this is checked one depth at a time instead of by recursion.
+
+    Yields
+    ------
+    r : ndarray
+        The indices of the beams in this chunk.
+    pr, pp : ndarray
+        The index into r of the beam and the primitive of each pair.
+    area : ndarray
+        The area of each pair; zero for pairs which are not reached.
+    """
+    if len(compiled) == 0:
+        return
+    params = compiled.params
+
+    # Limit the number of (beam, primitive) pairs and the size of the table
+    # of parents reached by each beam; start with the worst case then adapt
+    # the number of beams to the number of pairs found so far.
+    parents = max(1, np.unique(compiled.parent).size)
+    chunk = max(1, _MAX_PAIRS // max(len(compiled), parents))
+    i = 0
+    while i < offset.size:
+        r = np.arange(i, min(i + chunk, offset.size))
+        i += chunk
+        pr, pp = compiled.bvh.query(normal[r], offset[r], size[r] / 2)
+        chunk = max(1, int(_MAX_PAIRS * r.size /
+                           max(pr.size, r.size * parents)))
+
+        # Measure each kind of primitive for all of its pairs at once.
+        area = np.zeros(pr.size)
+        kind = compiled.kind[pp]
+        m = kind == compiled.CIRCLE
+        if np.any(m):
+            b, p = r[pr[m]], pp[m]
+            area[m] = _beamcirc_array(normal[b], offset[b], size[b],
+                                      params[p, :2], params[p, 2])
+        m = kind == compiled.POLYGON
+        if np.any(m):
+            b, p = r[pr[m]], pp[m]
+            area[m] = _beampoly_array(normal[b], offset[b], size[b],
+                                      compiled.vertices[compiled.polygon[p]])
+        m = kind == compiled.SUPERELLIPSE
+        if np.any(m):
+            b, p = r[pr[m]], pp[m]
+            area[m] = _beamsuperellipse_array(normal[b], offset[b], size[b],
+                                              params[p, :2], params[p, 2],
+                                              params[p, 3], params[p, 4])
+
+        if np.max(compiled.depth) > 0:
+            area = area * _reached(compiled, pr, pp, area, r.size)
+        yield r, pr, pp, area
+
+
+def _reached(compiled, pr, pp, area, rays):
+    """Return whether each (beam, primitive) pair is reached by the beam.
+
+    A pair is reached if the beam intersects the parent node of the
+    primitive's node and that parent's pair is also reached. Which beams
+    reach and hit each parent node is tracked in a dense (rays, parents)
+    table.
+    """
+    node = compiled.node[pp]
+    depth = compiled.depth[node]
+    parent = compiled.parent[node]
+
+    # Number the nodes which are parents.
+    parents = np.unique(compiled.parent[compiled.parent >= 0])
+    slot = np.full(compiled.parent.size, -1)
+    slot[parents] = np.arange(parents.size)
+    hit = np.zeros((rays, parents.size), dtype=bool)
+
+    reached = depth == 0
+    for level in range(np.max(compiled.depth) + 1):
+        m = depth == level
+        if level > 0:
+            reached[m] = hit[pr[m], slot[parent[m]]]
+        h = m & reached & (area > 0) & (slot[node] >= 0)
+        hit[pr[h], slot[node[h]]] = True
+    return reached
+
+
+_MAX_PAIRS = 2**20
+"""The maximum number of beam-geometry pairs intersected at once."""
+
+
+def beamcircs(theta, offset, size, circles):
+    """Intersection areas of many beams and many circles.
+
+    The array equivalent of :func:`beamcirc`; beams are described as in
+    :func:`project`.
+
+    Parameters
+    ----------
+    theta : ndarray
+        The (N,) angles of the beam normals from the x-axis in radians.
+    offset : ndarray
+        The (N,) signed distances from the origin to the beam centerlines.
+    size : ndarray or scalar
+        The sizes of the beams. i.e. the diameters
+    circles : Circle or list of Circles
+
+    Returns
+    -------
+    a : ndarray
+        The (N,) areas of the intersected regions for one Circle or the
+        (N, M) areas for a list of M Circles.
+    """
+    theta, offset, size = np.broadcast_arrays(theta, offset, size)
+    theta = np.ravel(theta).astype(float)
+    normal = np.stack([np.cos(theta), np.sin(theta)], axis=1)
+
+    if isinstance(circles, Circle):
+        return beamcircs(theta, offset, size, [circles])[:, 0]
+
+    center = np.array([c.center._x for c in circles]).reshape(-1, 2)
+    radius = np.array([c.radius for c in circles], dtype=float)
+    return _beamcirc_array(normal[:, np.newaxis],
+                           np.ravel(offset).astype(float)[:, np.newaxis],
+                           np.ravel(size).astype(float)[:, np.newaxis],
+                           center, radius)
+
+
+def _beamcirc_array(normal, offset, size, center, radius):
+    """Intersection areas of beams and circles.
+
+    The beams are given by their unit normals (..., 2), centerline offsets,
+    and sizes; the circles by their centers (..., 2) and radii. All of the
+    arguments are broadcast against each other; e.g. N beams with shape
+    (N, 1) and M circles with shape (M,) give (N, M) areas.
+    """
+    p = np.abs(np.sum(normal * center, axis=-1) - offset)
+    p, w, r = np.broadcast_arrays(p, np.asarray(size) / 2, radius)
+
+    a = np.zeros(p.shape)
+    hit = (w > 0) & (r > 0) & (p < w + r)
+    if not np.any(hit):
+        return a
+    p, w, r = p[hit], w[hit], r[hit]
+
+    # The same cases as beamcirc with the halfspaces which are always empty
+    # evaluating to zero.
+    f = halfspacecirc(np.abs(p - w), r)
+    f = np.where(p < w, 1 - f, f) - halfspacecirc(w + p, r)
+
+    a[hit] = np.pi * r**2 * np.maximum(f, 0)
+    return a
+
+
+def _beamsuperellipse_array(normal, offset, size, center, a, b, n):
+    """Intersection areas of beams and superellipses.
+
+    The beams are given by their unit normals (..., 2), centerline offsets,
+    and sizes; the superellipses by their centers (..., 2) and parameters a,
+    b, and n. All of the arguments are broadcast against each other.
+
+    Each superellipse is mapped to the unit superellipse by scaling x by 1 / a
+    and y by 1 / b which scales every area by 1 / ab. Beams remain strips
+    under this map, so the area is computed for the unit shape and scaled
+    back. Ellipses become the unit circle and n = 1 the unit diamond; other
+    convex shapes (n > 1) and star shapes (0 < n < 1) have their own kernels.
+    """
+    a, b = np.asarray(a, dtype=float), np.asarray(b, dtype=float)
+    scaled = normal * np.stack(np.broadcast_arrays(a, b), axis=-1)
+    length = np.sqrt(np.sum(scaled**2, axis=-1))
+    offset = (offset - np.sum(normal * center, axis=-1)) / length
+    size = size / length
+    normal = scaled / length[..., np.newaxis]
+
+    offset, size, a, b, n = np.broadcast_arrays(offset, size, a, b, n)
+    normal = np.broadcast_to(normal, offset.shape + (2, ))
+
+    area = np.zeros(offset.shape)
+    valid = (a > 0) & (b > 0)
+
+    m = valid & (n == 2)
+    area[m] = _beamcirc_array(normal[m], offset[m], size[m], np.zeros(2), 1)
+    m = valid & (n == 1)
+    area[m] = _beampoly_array(normal[m], offset[m], size[m],
+                              np.array([[1, 0], [0, 1], [-1, 0], [0, -1]]))
+    m = valid & (n > 1) & (n != 2)
+    area[m] = np.maximum(
+        _superellipse_below(normal[m], offset[m] + size[m] / 2, n[m]) -
+        _superellipse_below(normal[m], offset[m] - size[m] / 2, n[m]), 0)
+    m = valid & (n > 0) & (n < 1)
+    if np.any(m):
+        # The shape is symmetric across both axes and the diagonal, so make
+        # the normal point up and mostly along y.
+        nm = normal[m]
+        lo, hi = offset[m] - size[m] / 2, offset[m] + size[m] / 2
+        swap = np.abs(nm[:, 1]) < np.abs(nm[:, 0])
+        nm = np.where(swap[:, np.newaxis], nm[:, ::-1], nm)
+        down = nm[:, 1] < 0
+        nm = np.where(down[:, np.newaxis], -nm, nm)
+        lo, hi = np.where(down, -hi, lo), np.where(down, -lo, hi)
+        area[m] = np.maximum(_star_below(nm, hi, n[m]) -
+                             _star_below(nm, lo, n[m]), 0)
+    return a * b * area
+
+
+def _superellipse_below(normal, t, n):
+    """Return the areas of the unit superellipses |x|^n + |y|^n <= 1 for
+    n > 1 below the lines normal . x = t.
+
+    The region is bounded by the chord between the two points where a line
+    crosses the boundary and by the arc between them. The arc is measured
+    with the area of the sector swept from the positive x-axis which has a
+    closed form in terms of the regularized incomplete beta function.
+    """
+    quarter = special.beta(1 / n, 1 / n) / (2 * n)
+    exponent = n[..., np.newaxis]
+
+    # The line is tangent to the level set of the superellipse which touches
+    # it at the point where the level set's support function equals t.
+    # Powers of the normal's components are taken relative to the largest
+    # one because q is very large when n is near 1.
+    q = n / (n - 1)
+    largest = np.max(np.abs(normal), axis=-1)
+    ratio = np.abs(normal) / largest[..., np.newaxis]
+    total = np.sum(ratio**q[..., np.newaxis], axis=-1)
+    support = largest * total**(1 / q)
+    t = np.clip(t, -support, support)
+    foot = (np.sign(normal) * ratio**(q - 1)[..., np.newaxis] *
+            (t / (largest * total))[..., np.newaxis])
+    tangent = np.stack([-normal[..., 1], normal[..., 0]], axis=-1)
+
+    # Bisect for the two crossings along the line on either side of the foot.
+    # The superellipse fits inside the unit square, so neither is more than 3
+    # from the foot.
+    crossing = []
+    for sign in [1, -1]:
+        inner, outer = np.zeros(t.shape), np.full(t.shape, 3.)
+        for i in range(_BISECTIONS):
+            middle = (inner + outer) / 2
+            x = foot + sign * middle[..., np.newaxis] * tangent
+            inside = np.sum(np.abs(x)**exponent, axis=-1) <= 1
+            inner = np.where(inside, middle, inner)
+            outer = np.where(inside, outer, middle)
+        crossing.append(foot + sign * inner[..., np.newaxis] * tangent)
+
+    def sector(x):
+        """The area swept counterclockwise from the positive x-axis to x."""
+        quadrant = (np.arctan2(x[..., 1], x[..., 0]) // (np.pi / 2)) % 4
+        # Within a quadrant, the swept area is a quarter times I(u), where u
+        # is |y|^n or |x|^n for even or odd quadrants. Since I(u) is
+        # 1 - I(1 - u), evaluate it at the smaller of u and 1 - u to keep its
+        # precision when u rounds to 1.
+        u = np.abs(x)**exponent
+        u = u / np.sum(u, axis=-1, keepdims=True)
+        u = np.where((quadrant % 2 == 0)[..., np.newaxis], u, u[..., ::-1])
+        small = special.betainc(1 / n, 1 / n, np.min(u, axis=-1))
+        swept = np.where(u[..., 1] <= u[..., 0], small, 1 - small)
+        return quarter * (quadrant + swept)
+
+    # Walk the chord along the tangent, then the arc counterclockwise back.
+    ahead, behind = crossing
+    arc = (sector(behind) - sector(ahead)) % (4 * quarter)
+    chord = (behind[..., 0] * ahead[..., 1] - behind[..., 1] * ahead[..., 0])
+    area = arc + chord / 2
+    area = np.where(t >= support, 4 * quarter, area)
+    return np.where(t <= -support, 0, area)
+
+
+_BISECTIONS = 53
+"""The number of bisections to locate a point to double precision."""
+
+
+def _star_below(normal, t, n):
+    """Return the areas of the unit superellipses |x|^n + |y|^n <= 1 for
+    0 < n < 1 below the lines normal . x = t where normal[..., 1] > 0.
+
+    These shapes are not convex, but every vertical slice of them is the
+    interval |y| <= h(x) = (1 - |x|^n)^(1 / n), so the area below a line y =
+    L(x) is the integral of clip(L(x) + h(x), 0, 2 h(x)). On each side of the
+    y-axis h is convex, so L crosses h and -h at most twice each. Between the
+    crossings, which are found by bisection, the integrand is 0, 2 h, or L +
+    h; the integral of h has a closed form in terms of the incomplete beta
+    function.
+    """
+    slope = -normal[..., 0] / normal[..., 1]
+    t = t / normal[..., 1]
+    return _star_half_below(slope, t, n) + _star_half_below(-slope, t, n)
+
+
+def _star_half_below(slope, t, n):
+    """Return the area of the part of _star_below where x >= 0 below the lines
+    y = t + slope * x."""
+    zero, one = np.zeros(t.shape), np.ones(t.shape)
+
+    def line(x):
+        return t + slope * x
+
+    def h(x):
+        return _star_height(x, n)
+
+    # L - h is concave and L + h is convex, so split each at its extremum.
+    peak = _bisect(lambda x: _star_slope(x, n) - slope, zero, one)
+    trough = _bisect(lambda x: slope + _star_slope(x, n), zero, one)
+    breaks = np.stack([
+        zero, one,
+        _bisect(lambda x: line(x) - h(x), zero, peak),
+        _bisect(lambda x: h(x) - line(x), peak, one),
+        _bisect(lambda x: -line(x) - h(x), zero, trough),
+        _bisect(lambda x: line(x) + h(x), trough, one)], axis=-1)
+    breaks.sort(axis=-1)
+
+    # Integrate each piece between consecutive crossings.
+    start, stop = breaks[..., :-1], breaks[..., 1:]
+    middle = (start + stop) / 2
+    t, slope = t[..., np.newaxis], slope[..., np.newaxis]
+    n = n[..., np.newaxis]
+    height = _star_height(middle, n)
+    y = t + slope * middle
+    arc = _star_integral(stop, n) - _star_integral(start, n)
+    chord = t * (stop - start) + slope * (stop**2 - start**2) / 2
+    part = np.where(y >= height, 2 * arc,
+                    np.where(y <= -height, 0, chord + arc))
+    return np.sum(part, axis=-1)
+
+
+def _star_height(x, n):
+    """The boundary (1 - x^n)^(1 / n) of the unit superellipse for x >= 0."""
+    return np.maximum(1 - x**n, 0)**(1 / n)
+
+
+def _star_slope(x, n):
+    """The derivative of _star_height."""
+    return -x**(n - 1) * np.maximum(1 - x**n, 0)**(1 / n - 1)
+
+
+def _star_integral(x, n):
+    """The integral of _star_height from 0 to x."""
+    return (special.beta(1 / n, 1 / n + 1) / n *
+            special.betainc(1 / n, 1 / n + 1, x**n))
+
+
+def _bisect(f, lo, hi):
+    """Return where the increasing function f crosses zero in [lo, hi].
+
+    Returns lo where f is positive and hi where f is negative everywhere.
+    """
+    for i in range(_BISECTIONS):
+        middle = (lo + hi) / 2
+        below = f(middle) < 0
+        lo = np.where(below, middle, lo)
+        hi = np.where(below, hi, middle)
+    return lo
+
 
+def beampolys(theta, offset, size, polygons):
+    """Intersection areas of many beams and many convex polygons.
 
-def sinogram(sx, sy, phantom, noise=False):
+    The array equivalent of :func:`beampoly`; beams are described as in
+    :func:`project`. Areas are computed directly from the polygon vertices
+    without constructing any polytope.
+
+    Parameters
+    ----------
+    theta : ndarray
+        The (N,) angles of the beam normals from the x-axis in radians.
+    offset : ndarray
+        The (N,) signed distances from the origin to the beam centerlines.
+    size : ndarray or scalar
+        The sizes of the beams. i.e. the diameters
+    polygons : Polygon or list of Polygons
+
+    Returns
+    -------
+    a : ndarray
+        The (N,) areas of the intersected regions for one Polygon or the
+        (N, M) areas for a list of M Polygons.
+    """
+    theta, offset, size = np.broadcast_arrays(theta, offset, size)
+    theta = np.ravel(theta).astype(float)
+    normal = np.stack([np.cos(theta), np.sin(theta)], axis=1)
+
+    if isinstance(polygons, Polygon):
+        return beampolys(theta, offset, size, [polygons])[:, 0]
+
+    return _beampoly_array(normal[:, np.newaxis],
+                           np.ravel(offset).astype(float)[:, np.newaxis],
+                           np.ravel(size).astype(float)[:, np.newaxis],
+                           _polygon_vertices(polygons))
+
+
+def _beampoly_array(normal, offset, size, vertices):
+    """Intersection areas of beams and convex polygons.
+
+    The beams are given as in :func:`_beamcirc_array` and the polygons by
+    their vertices (..., V, 2). All of the arguments are broadcast against
+    each other; e.g. N beams with shape (N, 1) and M polygons with shape
+    (M, V, 2) give (N, M) areas.
+
+    The area of a polygon on the near side of a line is the shoelace formula
+    applied to each edge clipped by the line with the origin moved onto the
+    line; the segment of the line which closes the clipped polygon then has
+    no contribution. The area in the beam is the difference of the areas
+    below its two edges.
+    """
+    normal = normal[..., np.newaxis, :]
+
+    # Move the origin to the center of each polygon to limit roundoff.
+    center = np.mean(vertices, axis=-2, keepdims=True)
+    v = vertices - center
+    e = np.roll(v, -1, axis=-2) - v
+
+    # Distances along the beam normals: t of the vertices, h of the beams.
+    t = np.sum(normal * v, axis=-1)
+    h = offset - np.sum(normal * center, axis=(-2, -1))
+    w = np.asarray(size) / 2
+
+    # Cross products of the vertices with their edges, v x e, and of the
+    # normals with the edges, n x e.
+    vxe = v[..., 0] * e[..., 1] - v[..., 1] * e[..., 0]
+    nxe = normal[..., 0] * e[..., 1] - normal[..., 1] * e[..., 0]
+
+    def _area_below(h):
+        ta = t - h[..., np.newaxis]
+        tb = np.roll(ta, -1, axis=-1)
+        # The fraction of each edge from a to b on the side where ta <= 0.
+        with np.errstate(divide='ignore', invalid='ignore'):
+            uc = ta / (ta - tb)
+            u0 = np.where(ta <= 0, 0, uc)
+            u1 = np.where(tb <= 0, 1, uc)
+            du = np.where((ta > 0) & (tb > 0), 0, u1 - u0)
+        # (a - q) x e where q = n * h is the new origin on the line.
+        return np.sum(du * (vxe - h[..., np.newaxis] * nxe), axis=-1) / 2
+
+    a = np.abs(_area_below(h + w) - _area_below(h - w))
+    return np.where(w == 0, 0, a)
+
+
+def _raster_endpoints(sx, sy, rows=None):
+    """Return the closed-form beam positions of :func:`raster_scan`.
+
+    Parameters
+    ----------
+    rows : ndarray, optional
+        The projections to return; all sx of them by default.
+
+    Returns
+    -------
+    endpoints : ndarray
+        The (rows * sy, 4) coordinates [x1, y1, x2, y2] of the Probe at each
+        position in the order that it is yielded by :func:`raster_scan`.
+    """
+    rows = np.arange(sx) if rows is None else np.asarray(rows)
+    step = 1. / sy
+    theta = np.pi / sx * rows
+    x = step / 2. + step * np.arange(sy)
+
+    # Rotate the vertical probe positions around the center.
+    points = np.empty((sy, 2, 2))
+    points[..., 0] = x[:, np.newaxis]
+    points[..., 1] = [-10, 10]
+    points = _rotate(points, theta[:, np.newaxis, np.newaxis],
+                     np.array([0.5, 0.5]))
+    return points.reshape(-1, 4)
+
+
+def _angle_endpoints(sx, sy, rows=None):
+    """Return the closed-form beam positions of :func:`angle_scan`.
+
+    The nth beam of the mth projection is the initial vertical beam rotated
+    by -n * alpha around (0, 0.5) and then by -m * beta around (0.5, 0.5).
+
+    Parameters
+    ----------
+    rows : ndarray, optional
+        The projections to return; all sx of them by default.
+
+    Returns
+    -------
+    endpoints : ndarray
+        The (rows * sy, 4) coordinates [x1, y1, x2, y2] of the Probe at each
+        position in the order that it is yielded by :func:`angle_scan`.
+    """
+    rows = np.arange(sx) if rows is None else np.asarray(rows)
+    step = 0.1 / sy
+    beta = np.pi / (sx + 1)
+    alpha = np.pi / sy
+
+    points = np.array([[step / 2., -10], [step / 2., 10]])
+    points = _rotate(points, -alpha * np.arange(sy)[:, np.newaxis],
+                     np.array([0, 0.5]))
+    points = _rotate(points, -beta * rows[:, np.newaxis, np.newaxis],
+                     np.array([0.5, 0.5]))
+    return points.reshape(-1, 4)
+
+
+def _row_geometry(endpoints, sx, sy, rows):
+    """Return the (rows, sy) normal angles and offsets of the beams in rows
+    of the scan whose closed-form positions are endpoints(sx, sy, rows)."""
+    theta, offset = _endpoints_to_geometry(endpoints(sx, sy, rows))
+    return theta.reshape(-1, sy), offset.reshape(-1, sy)
+
+
+def _rotate(points, theta, center):
+    """Return (..., 2) points rotated by theta radians around center.
+
+    The shape of theta must broadcast with the shape of points[..., 0].
+    """
+    cos, sin = np.cos(theta), np.sin(theta)
+    dx, dy = points[..., 0] - center[0], points[..., 1] - center[1]
+    return np.stack([cos * dx - sin * dy + center[0],
+                     sin * dx + cos * dy + center[1]], axis=-1)
+
+
+def _endpoints_to_geometry(endpoints):
+    """Return the normal angles and offsets of beams given their endpoints."""
+    p1, p2 = endpoints[:, 0:2], endpoints[:, 2:4]
+    tangent = p2 - p1
+    tangent /= np.sqrt(np.sum(tangent**2, axis=1))[:, np.newaxis]
+    normal = np.stack([tangent[:, 1], -tangent[:, 0]], axis=1)
+    theta = np.arctan2(normal[:, 1], normal[:, 0])
+    offset = np.sum(normal * p1, axis=1)
+    return theta, offset
+
+
+def _measured_probe(endpoints, size):
+    """Return a Probe at the last position whose history is endpoints."""
+    probe = Probe(Point(endpoints[-1, 0:2]), Point(endpoints[-1, 2:4]), size)
+    probe.history = endpoints
+    return probe
+
+
+def _project_rows(phantom, shape, beams, size, workers=None, out=None):
+    """Return :func:`project` of (sx, sy) beams split by rows over workers.
+
+    beams(rows) returns the normal angles and offsets of the beams in the
+    given rows, so only the positions of the rows being measured are held in
+    memory. The phantom is sent to each worker process once when the process
+    starts, then the rows are distributed in contiguous blocks and the results
+    are assembled in order. If out is given, each block of rows is written to
+    it as soon as it is measured and out is flushed when it has a flush
+    method.
+    """
+    if out is None and (workers is None or workers <= 1):
+        theta, offset = beams(np.arange(shape[0]))
+        return project(phantom, theta, offset, size)
+
+    if out is None:
+        out = np.empty(shape)
+    elif out.shape != tuple(shape):
+        raise ValueError("out must have shape {}, not {}.".format(
+                         tuple(shape), out.shape))
+
+    nblocks = max(1, -(-out.size // _MAX_PAIRS))
+    if workers is not None and workers > 1:
+        # Use a few blocks per worker to balance the load between them.
+        nblocks = max(nblocks, 4 * workers)
+    blocks = np.array_split(np.arange(shape[0]), nblocks)
+    blocks = [b for b in blocks if b.size > 0]
+
+    if workers is None or workers <= 1:
+        rows = (project(phantom, *beams(b), size=size) for b in blocks)
+        _write_rows(out, blocks, rows)
+    else:
+        with ProcessPoolExecutor(max_workers=workers,
+                                 initializer=_init_worker,
+                                 initargs=(phantom,)) as pool:
+            rows = _imap(pool, _project_worker,
+                         (beams(b) + (size, ) for b in blocks), 2 * workers)
+            _write_rows(out, blocks, rows)
+    return out
+
+
+def _imap(pool, function, arguments, pending):
+    """Yield function(*args) for each tuple in arguments in order.
+
+    Unlike pool.map, at most pending tasks are submitted ahead of the result
+    being yielded, so the arguments are only made as they are needed.
+    """
+    futures = deque()
+    for args in arguments:
+        if len(futures) >= pending:
+            yield futures.popleft().result()
+        futures.append(pool.submit(function, *args))
+    while futures:
+        yield futures.popleft().result()
+
+
+def _write_rows(out, blocks, rows):
+    """Copy each block of rows into out and flush it if possible."""
+    for b, row in zip(blocks, rows):
+        out[b[0]:b[-1] + 1] = row
+        if hasattr(out, 'flush'):
+            out.flush()
+
+
+_worker_phantom = None
+"""The Phantom measured by the current worker process."""
+
+
+def _init_worker(phantom):
+    global _worker_phantom
+    _worker_phantom = phantom
+
+
+def _project_worker(theta, offset, size):
+    return project(_worker_phantom, theta, offset, size)
+
+
+def project_stack(phantoms, scan, workers=None, out=None):
+    """Return the measurements of a stack of phantoms by one Scan.
+
+    The beam normals, offsets, and sizes are computed once and shared by all
+    of the slices, which are measured like :func:`project`.
+
+    Parameters
+    ----------
+    phantoms : iterable of Phantom
+        The slices; may be a generator, in which case only the slices being
+        measured, at most two per worker, are held in memory.
+    scan : Scan
+    workers : int, optional
+        The number of processes which measure the slices in parallel.
+    out : array-like, optional
+        A writable (slices, ) + scan.shape array to store the measurements in.
+        Each slice is written as soon as it is measured.
+
+    Returns
+    -------
+    data : ndarray
+        The (slices, ) + scan.shape measurements.
+    """
+    beams = _scan_beams(scan)
+    if workers is None or workers <= 1:
+        slices = (_project_slice(phantom, *beams) for phantom in phantoms)
+        return _write_slices(slices, scan.shape, out)
+
+    with ProcessPoolExecutor(max_workers=workers,
+                             initializer=_init_stack_worker,
+                             initargs=beams) as pool:
+        slices = _imap(pool, _project_stack_worker,
+                       ((phantom, ) for phantom in phantoms), 2 * workers)
+        return _write_slices(slices, scan.shape, out)
+
+
+def _scan_beams(scan):
+    """Return the raveled normals, offsets, and sizes of the beams of scan."""
+    theta = scan.theta.ravel()
+    normal = np.stack([np.cos(theta), np.sin(theta)], axis=1)
+    offset = scan.offset.ravel().astype(float)
+    size = np.broadcast_to(scan.size, theta.shape).astype(float)
+    return normal, offset, size
+
+
+def _project_slice(phantom, normal, offset, size):
+    data = np.zeros(offset.size)
+    _project_compiled(phantom.compiled, normal, offset, size, data)
+    return data
+
+
+def _write_slices(slices, shape, out):
+    """Copy each slice into out or stack them if out is None."""
+    if out is None:
+        return np.array([data.reshape(shape) for data in slices]
+                        ).reshape((-1, ) + shape)
+    count = 0
+    for data in slices:
+        out[count] = data.reshape(shape)
+        count += 1
+        if hasattr(out, 'flush'):
+            out.flush()
+    if count != len(out):
+        raise ValueError("out has {} slices but {} were measured.".format(
+                         len(out), count))
+    return out
+
+
+_worker_beams = None
+"""The normals, offsets, and sizes of the beams of the current worker."""
+
+
+def _init_stack_worker(normal, offset, size):
+    global _worker_beams
+    _worker_beams = (normal, offset, size)
+
+
+def _project_stack_worker(phantom):
+    return _project_slice(phantom, *_worker_beams)
+
+
+def project_polychromatic(phantom, scan, energy, spectrum,
+                          attenuation=None):
+    """Return the polychromatic measurements of a phantom.
+
+    The geometric path lengths through each distinct material of the Phantom
+    are measured once; the mass_atten of each node weights its path lengths
+    like in :func:`project`. Then the transmitted spectrum of every beam is
+    found by the Beer-Lambert law for all of the energies at once, and the
+    measurement is the negative log of the fraction of photons which are
+    transmitted. Nodes without a material have the same attenuation at every
+    energy, so if every node has no material, the result is the same as
+    :func:`project`.
+
+    Parameters
+    ----------
+    phantom : Phantom
+    scan : Scan
+    energy : ndarray
+        The (E, ) photon energies of the bins of the spectrum [keV].
+    spectrum : ndarray
+        The (E, ) number of incident photons in each bin.
+    attenuation : dict, optional
+        Maps a :class:`.Material` to its (E, ) linear attenuation at energy.
+        Materials which are missing are asked for
+        :meth:`.Material.linear_attenuation`.
+
+    Returns
+    -------
+    data : ndarray
+        The measurements in the shape of the Scan.
+    """
+    energy = np.atleast_1d(energy).astype(float)
+    spectrum = np.atleast_1d(spectrum).astype(float)
+    if spectrum.shape != energy.shape:
+        raise ValueError("spectrum must have shape {}, not {}.".format(
+                         energy.shape, spectrum.shape))
+    attenuation = dict() if attenuation is None else attenuation
+
+    # Number the distinct materials and find their (K, E) attenuation.
+    compiled = phantom.compiled
+    materials, index = [], []
+    for material in compiled.material:
+        for k, known in enumerate(materials):
+            if known is material:
+                break
+        else:
+            k = len(materials)
+            materials.append(material)
+        index.append(k)
+    mu = np.ones((max(1, len(materials)), energy.size))
+    for k, material in enumerate(materials):
+        if material is not None:
+            if material in attenuation:
+                mu[k] = attenuation[material]
+            else:
+                mu[k] = material.linear_attenuation(energy)
+
+    weight = np.zeros((len(compiled), mu.shape[0]))
+    weight[np.arange(len(compiled)), index] = compiled.mass_atten
+
+    normal, offset, size = _scan_beams(scan)
+    length = np.zeros((offset.size, mu.shape[0]))
+    _project_compiled(compiled, normal, offset, size, length, weight)
+
+    # Transmit the spectrum through the path lengths a block at a time.
+    data = np.empty(offset.size)
+    for b in np.array_split(np.arange(offset.size), max(
+            1, -(-offset.size * energy.size // _MAX_PAIRS))):
+        data[b] = np.einsum('be,e->b', np.exp(-np.einsum('bk,ke->be',
+                                                           length[b], mu)),
+                            spectrum)
+    return -np.log(data / np.sum(spectrum)).reshape(scan.shape)
+
+
+def sinogram(sx, sy, phantom, noise=False, workers=None, out=None,
+             seed=None, cache=None):
     """Return a sinogram of phantom and the probe.
 
     Parameters
@@ -316,25 +1813,87 @@ def sinogram(sx, sy, phantom, noise=False):
     sy : int
         Number of detection pixels (or sample translations).
     phantom : Phantom
+    noise : float >= 0, optional
+        The standard deviation of the normally distributed multiplicative
+        noise.
+    workers : int, optional
+        The number of processes which measure the projection angles in
+        parallel.
+    out : array-like, optional
+        A writable (sx, sy) array, such as the np.memmap returned by
+        :func:`create_sinogram_file`, to store the sinogram in. Rows are
+        written as they are measured.
+    seed : int, optional
+        Seeds the noise. If None, the global NumPy random state is used.
+    cache : SinogramCache, optional
+        Where to look for and store the sinogram. Noisy sinograms are only
+        cached when seed is given.
 
     Returns
     -------
     sino : ndarray
         Sinogram.
     probe : Probe
-        Probe with history.
+        Probe with history. The history is computed when it is first used.
     """
-    scan = raster_scan(sx, sy)
-    sino = np.zeros((sx, sy))
-    for m in range(sx):
-        for n in range(sy):
-            probe = next(scan)
-            sino[m, n] = probe.measure(phantom, noise)
+    beams = functools.partial(_row_geometry, _raster_endpoints, sx, sy)
+    sino = _simulate((sx, sy), beams, 1. / sy, 'sinogram', phantom, noise,
+                     workers, out, seed, cache)
+    return sino, _ScanProbe(_raster_endpoints, sx, sy, 1. / sy)
+
 
-    return sino, probe
+def create_sinogram_file(filename, sx, sy):
+    """Return a disk-backed array for :func:`sinogram` to write into.
 
+    The array is stored in the NumPy .npy format at filename and the scan
+    metadata is written to a JSON sidecar at filename + '.json'.
 
-def angleogram(sx, sy, phantom, noise=False):
+    Parameters
+    ----------
+    filename : str
+        Path of the .npy file to create.
+    sx : int
+        Number of rotation angles.
+    sy : int
+        Number of detection pixels (or sample translations).
+
+    Returns
+    -------
+    sino : np.memmap
+        A zero-filled (sx, sy) array mapped to filename.
+    """
+    metadata = {'sx': sx,
+                'sy': sy,
+                'step': 1. / sy,
+                'angles': (np.arange(sx) * np.pi / sx).tolist()}
+    with open(filename + '.json', 'w') as f:
+        json.dump(metadata, f, indent=2)
+    return np.lib.format.open_memmap(filename, mode='w+', dtype=float,
+                                     shape=(sx, sy))
+
+
+def load_sinogram_file(filename):
+    """Return a sinogram saved by :func:`create_sinogram_file`.
+
+    Parameters
+    ----------
+    filename : str
+        Path of the .npy file.
+
+    Returns
+    -------
+    sino : np.memmap
+        The read-only (sx, sy) sinogram.
+    metadata : dict
+        The scan metadata with keys sx, sy, step, and angles.
+    """
+    with open(filename + '.json') as f:
+        metadata = json.load(f)
+    return np.load(filename, mmap_mode='r'), metadata
+
+
+def angleogram(sx, sy, phantom, noise=False, workers=None, seed=None,
+               cache=None):
     """Return a angleogram of phantom and the probe.
 
     Parameters
@@ -344,22 +1903,271 @@ def angleogram(sx, sy, phantom, noise=False):
     sy : int
         Number of detection pixels (or sample translations).
     phantom : Phantom
+    noise : float >= 0, optional
+        The standard deviation of the normally distributed multiplicative
+        noise.
+    workers : int, optional
+        The number of processes which measure the projection angles in
+        parallel.
+    seed : int, optional
+        Seeds the noise. If None, the global NumPy random state is used.
+    cache : SinogramCache, optional
+        Where to look for and store the angleogram. Noisy angleograms are
+        only cached when seed is given.
 
     Returns
     -------
     angl : ndarray
         Angleogram.
     probe : Probe
-        Probe with history.
+        Probe with history. The history is computed when it is first used.
     """
-    scan = angle_scan(sx, sy)
-    angl = np.zeros((sx, sy))
-    for m in range(sx):
+    beams = functools.partial(_row_geometry, _angle_endpoints, sx, sy)
+    angl = _simulate((sx, sy), beams, 0.1 / sy, 'angleogram', phantom, noise,
+                     workers, None, seed, cache)
+    return angl, _ScanProbe(_angle_endpoints, sx, sy, 0.1 / sy)
+
+
+def _simulate(shape, beams, size, kind, phantom, noise, workers, out, seed,
+              cache):
+    """Return the noisy measurements of phantom by the beams of
+    :func:`_project_rows` using the cache."""
+    key = None
+    if cache is not None and (not noise > 0 or seed is not None):
+        key = cache.key(phantom, kind, shape, noise, seed)
+        data = cache.load(key)
+        if data is not None:
+            if out is None:
+                return data
+            out[:] = data
+            if hasattr(out, 'flush'):
+                out.flush()
+            return out
+
+    data = _project_rows(phantom, shape, beams, size, workers, out)
+    if noise > 0:
+        rng = np.random if seed is None else np.random.RandomState(seed)
+        for b in np.array_split(np.arange(shape[0]),
+                                max(1, -(-data.size // _MAX_PAIRS))):
+            data[b] += data[b] * rng.normal(scale=noise, size=data[b].shape)
+        if hasattr(data, 'flush'):
+            data.flush()
+
+    if key is not None:
+        cache.store(key, data)
+    return data
+
+
+def iter_projections(phantom, scan, sy=None):
+    """Measure a phantom one projection at a time.
+
+    Only the beam positions of the current projection are held in memory, so
+    downstream consumers can process each projection as soon as it is ready.
+
+    Parameters
+    ----------
+    phantom : Phantom
+    scan : iterator of Probe or Scan
+        A scanning pattern such as :func:`raster_scan` or :func:`angle_scan`,
+        or a Scan whose first axis is the projections.
+    sy : int
+        Number of detection pixels (or sample translations) in each
+        projection. Not needed if scan is a Scan.
+
+    Yields
+    ------
+    angle : float
+        The angle of the normal of the first beam in the projection.
+    row : ndarray
+        The (sy,) measurements of the projection.
+    """
+    if isinstance(scan, Scan):
+        return _iter_scan_projections(phantom, scan)
+    if sy is None:
+        raise ValueError("sy must be given unless scan is a Scan.")
+    return _iter_probe_projections(phantom, scan, sy)
+
+
+def _iter_scan_projections(phantom, scan):
+    for m in range(len(scan)):
+        row = scan[m]
+        yield row.theta.flat[0], project(phantom, row)
+
+
+def _iter_probe_projections(phantom, scan, sy):
+    scan = iter(scan)
+    while True:
+        endpoints = np.empty((sy, 4))
         for n in range(sy):
-            probe = next(scan)
-            angl[m, n] = probe.measure(phantom, noise)
+            try:
+                probe = next(scan)
+            except StopIteration:
+                if n > 0:
+                    raise ValueError("The scan ended partway through a "
+                                     "projection.")
+                return
+            endpoints[n] = probe.list
+        theta, offset = _endpoints_to_geometry(endpoints)
+        yield theta[0], project(phantom, theta, offset, probe.size)
+
+
+def photon_noise(data, flux, gain=1, readout=0, rng=None, workers=None,
+                 out=None):
+    """Return line integrals with photon counting and detector noise.
+
+    Each line integral is converted to an expected photon count using the
+    Beer-Lambert law. The detector signal is the gain times a Poisson draw of
+    that count plus normally distributed readout noise, and it is converted
+    back to a line integral. Signals below one photon are clipped to one
+    photon so the result stays finite.
+
+    The noise is generated in fixed blocks of rows, each with its own random
+    stream spawned from rng, so the result depends only on rng and not on the
+    number of workers.
+
+    Parameters
+    ----------
+    data : ndarray
+        Noiseless line integrals such as a sinogram.
+    flux : float > 0
+        The expected number of incident photons per ray.
+    gain : float > 0, optional
+        The detector signal per photon.
+    readout : float >= 0, optional
+        The standard deviation of the readout noise in detector signal units.
+    rng : np.random.Generator, np.random.SeedSequence, or int, optional
+        The source of randomness. Unpredictable by default.
+    workers : int, optional
+        The number of threads which generate blocks of noise in parallel.
+    out : ndarray, optional
+        An array with the shape of data for the result. It may be data.
+
+    Returns
+    -------
+    out : ndarray
+        The noisy line integrals.
+    """
+    if flux <= 0 or gain <= 0 or readout < 0:
+        raise ValueError("flux and gain must be positive and readout must be "
+                         "non-negative.")
+    data = np.atleast_1d(data)
+    if out is None:
+        out = np.empty(data.shape)
+
+    if isinstance(rng, np.random.Generator):
+        seed = np.random.SeedSequence(rng.integers(2**32, size=4))
+    elif isinstance(rng, np.random.SeedSequence):
+        seed = rng
+    else:
+        seed = np.random.SeedSequence(rng)
+
+    nblocks = max(1, min(data.shape[0], -(-data.size // _MAX_PAIRS)))
+    blocks = np.array_split(np.arange(data.shape[0]), nblocks)
+    blocks = [b for b in blocks if b.size > 0]
+    seeds = seed.spawn(len(blocks))
+
+    def noise_block(b, seed):
+        rng = np.random.default_rng(seed)
+        rows = slice(b[0], b[-1] + 1)
+        counts = rng.poisson(flux * np.exp(-data[rows]))
+        signal = gain * counts.astype(float)
+        if readout > 0:
+            signal += rng.normal(scale=readout, size=signal.shape)
+        out[rows] = -np.log(np.maximum(signal, gain) / (gain * flux))
+
+    if workers is None or workers <= 1:
+        for b, s in zip(blocks, seeds):
+            noise_block(b, s)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(noise_block, blocks, seeds))
+    return out
+
+
+def projection_matrix(sx, sy, size, workers=None):
+    """Return the system matrix of :func:`sinogram` for a pixel grid.
+
+    Entry [m * sy + n, iy * size + ix] is the exact area of overlap between
+    the nth beam at the mth angle of :func:`raster_scan` and the pixel in row
+    iy and column ix of a size x size grid covering the unit square like
+    :func:`.discrete_phantom`. So for an image of mass_atten values,
+    ``A.dot(image.ravel())`` is its (sx, sy) sinogram raveled.
+
+    When sx is even, the angles in the second half of the scan are the first
+    half rotated by 90 degrees about the center of the grid. Since the grid is
+    unchanged by this rotation, the rows of those angles are copies of the
+    first half with their columns permuted.
 
-    return angl, probe
+    Parameters
+    ----------
+    sx : int
+        Number of rotation angles.
+    sy : int
+        Number of detection pixels (or sample translations).
+    size : int
+        The side length in pixels of the grid.
+    workers : int, optional
+        The number of processes which compute the angles in parallel.
+
+    Returns
+    -------
+    A : scipy.sparse.csr_matrix
+        The (sx * sy, size * size) matrix.
+    """
+    half = sx // 2 if sx % 2 == 0 else sx
+    theta = np.pi / sx * np.arange(half)
+
+    if workers is None or workers <= 1:
+        rows = [_projection_matrix_angle(t, sy, size) for t in theta]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            rows = list(pool.map(_projection_matrix_angle, theta,
+                                 [sy] * half, [size] * half))
+
+    if half < sx:
+        # Rotating a pixel by 90 degrees moves it from (ix, iy) to
+        # (size - 1 - iy, ix).
+        iy, ix = np.divmod(np.arange(size * size), size)
+        rotated = ix * size + (size - 1 - iy)
+        rows += [(n, rotated[col], area) for n, col, area in rows]
+
+    n = np.concatenate([sy * m + r[0] for m, r in enumerate(rows)])
+    col = np.concatenate([r[1] for r in rows])
+    area = np.concatenate([r[2] for r in rows])
+    return sparse.csr_matrix((area, (n, col)), shape=(sx * sy, size * size))
+
+
+def _projection_matrix_angle(theta, sy, size):
+    """Return the nonzero overlaps of the beams at one angle and the pixels.
+
+    Returns
+    -------
+    n, col, area : ndarray
+        The beam index, pixel index, and overlap area of each nonzero entry.
+    """
+    normal = np.array([np.cos(theta), np.sin(theta)])
+    step = 1. / sy
+    # The offset of beam n is first + n * step.
+    first = normal.dot([0.5, 0.5]) + step / 2 - 0.5
+
+    # The pixel corners, then the range of beams which may reach each pixel.
+    iy, ix = np.divmod(np.arange(size * size), size)
+    corners = np.array([[0, 0], [1, 0], [1, 1], [0, 1]])
+    vertices = (np.stack([ix, iy], axis=1)[:, np.newaxis] + corners) / size
+    center = vertices.mean(axis=1).dot(normal)
+    extent = (np.sum(np.abs(normal)) / size + step) / 2
+    lo = np.clip(np.ceil((center - extent - first) / step), 0, sy)
+    hi = np.clip(np.floor((center + extent - first) / step) + 1, 0, sy)
+    count = (hi - lo).astype(int)
+
+    # Expand every (beam, pixel) candidate.
+    col = np.repeat(np.arange(size * size), count)
+    n = (np.repeat(lo.astype(int) - np.cumsum(count) + count, count) +
+         np.arange(col.size))
+    area = _beampoly_array(normal, first + n * step, step, vertices[col])
+
+    keep = area > 0
+    return n[keep], col[keep], area[keep]
 
 
 def raster_scan(sx, sy):
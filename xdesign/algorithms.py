@@ -49,9 +49,10 @@
 """Defines methods for reconstructing data from the :mod:`.acquisition` module.
 
 The algorithm module contains methods for reconstructing tomographic data
-including gridrec, SIRT, ART, and MLEM. These methods can be used as benchmarks
-for custom reconstruction methods or as an easy way to access reconstruction
-algorithms for developing other methods such as noise correction.
+including filtered backprojection, SIRT, ART, and MLEM. These methods can be
+used as benchmarks for custom reconstruction methods or as an easy way to
+access reconstruction algorithms for developing other methods such as noise
+correction.
 
 .. note::
     Using `tomopy <https://github.com/tomopy/tomopy>` is recommended instead
@@ -64,7 +65,11 @@ from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 
 import numpy as np
+from scipy import sparse
 import logging
+from copy import copy
+from concurrent.futures import ThreadPoolExecutor
+from cached_property import cached_property
 
 logger = logging.getLogger(__name__)
 
@@ -72,7 +77,8 @@ logger = logging.getLogger(__name__)
 __author__ = "Doga Gursoy"
 __copyright__ = "Copyright (c) 2016, UChicago Argonne, LLC."
 __docformat__ = 'restructuredtext en'
-__all__ = ['art', 'sirt', 'mlem', 'stream', 'update_progress']
+__all__ = ['Projector', 'siddon', 'fbp', 'art', 'sirt', 'mlem', 'os_sirt',
+           'osem', 'ordered_subsets', 'stream', 'update_progress']
 
 
 def update_progress(progress):
@@ -91,284 +97,485 @@ def update_progress(progress):
         print('')
 
 
-def art(probe, data, init, niter=10):
-    """Reconstruct data using ART algorithm."""
-    sx, sy = init.shape
-    data = data.flatten()
+class Projector(object):
+    """The lengths of the rays of a probe's history through a pixel grid.
+
+    Every ray is traced through the grid once, then :func:`art`,
+    :func:`sirt`, :func:`mlem`, and :func:`stream` reuse the trace for every
+    iteration as sparse matrix products. A Projector may be passed to them in
+    place of the probe to also share the trace between calls.
 
+    Attributes
+    ----------
+    shape : tuple
+        The (sx, sy) shape of the grid. The grid spans the unit square and
+        is divided into sy pixels along each side.
+    matrix : scipy.sparse.csr_matrix
+        The (rays, sx * sy) lengths of the rays through the pixels; the
+        column of pixel init[ix, iy] is ix * sy + iy.
+    """
+    def __init__(self, probe, shape):
+        self.shape = tuple(shape)
+        sx, sy = self.shape
+        indptr, ix, iy, dist = siddon(probe.history, sy)
+        self.matrix = sparse.csr_matrix((dist, ix * sy + iy, indptr),
+                                        shape=(indptr.size - 1, sx * sy))
+        self._blocks = dict()
+
+    def __getitem__(self, index):
+        """Return a Projector of the rays at index."""
+        projector = copy(self)
+        projector.__dict__.pop('sumdist', None)
+        projector.__dict__.pop('dist2', None)
+        projector._blocks = dict()
+        projector.matrix = self.matrix[index]
+        return projector
+
+    def forward(self, image, threads=None):
+        """Return the simulated measurement of each ray through image.
+
+        If threads > 1, blocks of rays are projected by a pool of threads.
+        """
+        image = np.ravel(image)
+        if threads is None or threads <= 1:
+            return self.matrix.dot(image)
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            parts = pool.map(lambda block: block[1].dot(image),
+                             self._split(threads))
+            return np.concatenate(list(parts))
+
+    def back(self, data, threads=None):
+        """Return the sum of data weighted by the rays through each pixel.
+
+        If threads > 1, blocks of rays are back projected by a pool of
+        threads into separate images which are then summed.
+        """
+        if threads is None or threads <= 1:
+            return self.matrix.T.dot(data).reshape(self.shape)
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            parts = pool.map(lambda block: block[1].T.dot(data[block[0]]),
+                             self._split(threads))
+            return np.sum(list(parts), axis=0).reshape(self.shape)
+
+    def _split(self, threads):
+        """Return [(rows, matrix)] blocks of rays with about equal lengths.
+
+        Scipy's sparse products release the GIL, so the blocks can be
+        multiplied by threads in parallel.
+        """
+        if threads not in self._blocks:
+            A = self.matrix
+            bounds = np.searchsorted(A.indptr, np.linspace(0, A.nnz,
+                                                           threads + 1))
+            bounds[0], bounds[-1] = 0, A.shape[0]
+            self._blocks[threads] = [(slice(i, j), A[i:j])
+                                     for i, j in zip(bounds[:-1], bounds[1:])
+                                     if j > i]
+        return self._blocks[threads]
+
+    @cached_property
+    def sumdist(self):
+        """The total length of all rays through each pixel."""
+        return np.asarray(self.matrix.sum(axis=0)).reshape(self.shape)
+
+    @cached_property
+    def dist2(self):
+        """The sum of the squared lengths of each ray through the pixels."""
+        return np.asarray(self.matrix.multiply(self.matrix).sum(axis=1)
+                          ).ravel()
+
+
+def siddon(endpoints, sy, chunk=2**18):
+    """Trace rays through an sy x sy grid on the unit square.
+
+    The rays are traced many at a time with array operations. The crossings
+    of each ray with the grid lines are sorted and the pixel of each segment
+    between consecutive crossings is found from its midpoint. At most about
+    chunk crossings are held in memory at once.
+
+    Parameters
+    ----------
+    endpoints : ndarray
+        The (N, 4) end points [x0, y0, x1, y1] of the rays; e.g. the history
+        of a Probe.
+    sy : int
+        The number of pixels along each side of the grid.
+    chunk : int, optional
+        The number of grid crossings to compute at once.
+
+    Returns
+    -------
+    indptr : ndarray
+        The (N + 1, ) offsets of the pixels of each ray; the pixels of ray m
+        are at indptr[m]:indptr[m + 1] in the other arrays.
+    ix, iy : ndarray
+        The indices of the pixels crossed by the rays.
+    dist : ndarray
+        The nonzero length of each ray through each pixel.
+    """
+    endpoints = np.asarray(endpoints, dtype=float).reshape(-1, 4)
     # grid frame (gx, gy)
-    gx = np.linspace(0, 1, sy + 1)
-    gy = np.linspace(0, 1, sy + 1)
+    grid = np.linspace(0, 1, sy + 1)
+
+    counts, ixs, iys, dists = [], [], [], []
+    step = max(1, chunk // (2 * sy + 2))
+    for i in range(0, endpoints.shape[0], step):
+        x0, y0, x1, y1 = np.moveaxis(endpoints[i:i + step, :, np.newaxis],
+                                     1, 0)
+
+        # avoid upper-right boundary errors
+        x0 = np.where(x1 - x0 == 0, x0 + 1e-6, x0)
+        y0 = np.where(y1 - y0 == 0, y0 + 1e-6, y0)
+
+        # vector lengths (ax, ay)
+        ax = (grid - x0) / (x1 - x0)
+        ay = (grid - y0) / (y1 - y0)
+
+        # edges of alpha (a0, a1)
+        a0 = np.maximum(np.maximum(np.minimum(ax[:, :1], ax[:, -1:]),
+                                   np.minimum(ay[:, :1], ay[:, -1:])), 0)
+        a1 = np.minimum(np.minimum(np.maximum(ax[:, :1], ax[:, -1:]),
+                                   np.maximum(ay[:, :1], ay[:, -1:])), 1)
+
+        # sorted alpha vectors; crossings outside the grid sort last
+        alpha = np.concatenate([ax, ay], axis=1)
+        alpha[(alpha < a0) | (alpha > a1)] = np.inf
+        alpha.sort(axis=1)
+        valid = np.isfinite(alpha[:, 1:])
+
+        # lengths
+        with np.errstate(invalid='ignore'):
+            xv = x0 + alpha * (x1 - x0)
+            yv = y0 + alpha * (y1 - y0)
+            dist = np.sqrt(np.diff(xv, axis=1)**2 + np.diff(yv, axis=1)**2)
+            mid = alpha[:, :-1] + np.diff(alpha, axis=1) / 2.
+        ind = valid & (dist != 0)
+
+        # indexing
+        mid = mid[ind]
+        rows = np.nonzero(ind)[0]
+        x0, y0, x1, y1 = x0[rows, 0], y0[rows, 0], x1[rows, 0], y1[rows, 0]
+        ixs.append(np.floor(sy * (x0 + mid * (x1 - x0))).astype('int'))
+        iys.append(np.floor(sy * (y0 + mid * (y1 - y0))).astype('int'))
+        dists.append(dist[ind])
+        counts.append(np.sum(ind, axis=1))
+
+    indptr = np.zeros(endpoints.shape[0] + 1, dtype=int)
+    if counts:
+        np.cumsum(np.concatenate(counts), out=indptr[1:])
+        return (indptr, np.concatenate(ixs), np.concatenate(iys),
+                np.concatenate(dists))
+    return (indptr, np.zeros(0, dtype=int), np.zeros(0, dtype=int),
+            np.zeros(0))
+
+
+def _projector(probe, init):
+    """Return probe if it is a Projector of init's grid or trace it."""
+    if isinstance(probe, Projector) and probe.shape == init.shape:
+        return probe
+    return Projector(probe, init.shape)
+
+
+def fbp(data, size=None, filter='ramlak'):
+    """Reconstruct a sinogram using filtered backprojection.
+
+    Each projection is convolved with a ramp filter using np.fft, then the
+    filtered projections are linearly interpolated at every pixel and summed
+    over the angles. For speed, the interpolation is done once on a grid
+    eight times finer than the detector and each pixel takes the nearest
+    sample.
+
+    The geometry is that of :func:`.raster_scan`: row m of data is at the
+    angle m * pi / sx and column n is the beam whose centerline is (n + 0.5)
+    / sy - 0.5 from the center of the unit square. The reconstruction has
+    the layout and units of :func:`art` and :func:`sirt`, so it is a fast
+    initial guess for them: init[ix, iy] is the pixel at x = (ix + 0.5) /
+    size, y = (iy + 0.5) / size and A.dot(init.ravel()) approximates data
+    where A is the :class:`Projector` of the scan.
+
+    Parameters
+    ----------
+    data : ndarray
+        The (sx, sy) sinogram from :func:`.sinogram`.
+    size : int, optional
+        The number of pixels along each side of the reconstruction;
+        defaults to sy.
+    filter : str, optional
+        The ramp filter; 'ramlak', 'shepp-logan', or 'hann'.
+
+    Returns
+    -------
+    init : ndarray
+        The (size, size) reconstruction.
+    """
+    data = np.asarray(data, dtype=float)
+    sx, sy = data.shape
+    size = sy if size is None else size
+
+    # The corners of the image are up to pad beams beyond the edges of the
+    # detector, where the filtered projections are not zero.
+    pad = int(np.ceil(sy * (np.sqrt(2) - 1) / 2)) + 2
+    filtered = _ramp_filter(data, filter, pad)
+
+    # Sample the filtered projections finely so that each pixel only looks
+    # up its nearest sample.
+    upsample = 8
+    fine = np.arange(-pad * upsample, (sy + pad) * upsample) / upsample
+    beams = np.arange(-pad, sy + pad)
+
+    # The detector coordinate of each pixel is separable into x and y parts.
+    x = (np.arange(size) + 0.5) / size - 0.5
+    init = np.zeros((size, size))
+    t = np.empty((size, size))
+    index = np.empty((size, size), dtype=np.intp)
+    for m in range(sx):
+        theta = m * np.pi / sx
+        row = np.interp(fine, beams, filtered[m])
+        tx = ((x * np.cos(theta) + 0.5) * sy - 0.5 + pad) * upsample + 0.5
+        ty = x * np.sin(theta) * sy * upsample
+        np.add(tx[:, np.newaxis], ty, out=t)
+        index[...] = t
+        init += row[index]
+    return init * np.pi * sy / sx
+
+
+def _ramp_filter(data, filter, pad=0):
+    """Return the rows of data convolved with a ramp filter.
+
+    The result includes pad beams beyond each edge of the detector.
+
+    The filter is the Fourier transform of the spatial ramp kernel of a band
+    limited signal with unit sampling, 1 / 4 at zero and -1 / (pi k)**2 at
+    odd k, so that it has no DC bias. It is windowed in frequency space.
+    """
+    sy = data.shape[1]
+    n = max(64, int(2**np.ceil(np.log2(2 * (sy + pad)))))
+    k = np.fft.fftfreq(n) * n
+    kernel = np.zeros(n)
+    kernel[0] = 0.25
+    odd = k % 2 == 1
+    kernel[odd] = -1 / (np.pi * k[odd])**2
+    ramp = np.real(np.fft.fft(kernel))
+
+    freq = np.fft.fftfreq(n)
+    if filter == 'ramlak':
+        pass
+    elif filter == 'shepp-logan':
+        ramp *= np.sinc(freq)
+    elif filter == 'hann':
+        ramp *= 0.5 * (1 + np.cos(2 * np.pi * freq))
+    else:
+        raise ValueError("filter must be 'ramlak', 'shepp-logan', or 'hann',"
+                         " not {}.".format(filter))
+
+    spectrum = np.fft.rfft(data, n=n, axis=1)
+    filtered = np.fft.irfft(spectrum * ramp[:n // 2 + 1], n=n, axis=1)
+    return np.concatenate([filtered[:, n - pad:], filtered[:, :sy + pad]],
+                          axis=1)
 
-    _init = np.zeros(init.shape)
+
+def art(probe, data, init, niter=10):
+    """Reconstruct data using ART algorithm."""
+    projector = _projector(probe, init)
+    A = projector.matrix
+    dist2 = projector.dist2
+    data = data.flatten()
+    x = init.reshape(-1).copy()
 
     for n in range(niter):
         update_progress(n/niter)
-        for m in range(len(probe.history)):
-            x0 = probe.history[m][0]
-            y0 = probe.history[m][1]
-            x1 = probe.history[m][2]
-            y1 = probe.history[m][3]
-            # print (m, x0, y0, x1, y1)
-
-            # avoid upper-right boundary errors
-            if (x1 - x0) == 0:
-                x0 += 1e-6
-            if (y1 - y0) == 0:
-                y0 += 1e-6
-
-            # vector lengths (ax, ay)
-            ax = (gx - x0) / (x1 - x0)
-            ay = (gy - y0) / (y1 - y0)
-
-            # edges of alpha (a0, a1)
-            ax0 = min(ax[0], ax[-1])
-            ax1 = max(ax[0], ax[-1])
-            ay0 = min(ay[0], ay[-1])
-            ay1 = max(ay[0], ay[-1])
-            a0 = max(max(ax0, ay0), 0)
-            a1 = min(min(ax1, ay1), 1)
-
-            # sorted alpha vector
-            cx = (ax >= a0) & (ax <= a1)
-            cy = (ay >= a0) & (ay <= a1)
-            alpha = np.sort(np.r_[ax[cx], ay[cy]])
-
-            # lengths
-            xv = x0 + alpha * (x1 - x0)
-            yv = y0 + alpha * (y1 - y0)
-            lx = np.ediff1d(xv)
-            ly = np.ediff1d(yv)
-            dist = np.sqrt(lx**2 + ly**2)
-            dist2 = np.dot(dist, dist)
-            ind = dist != 0
-
-            # indexing
-            mid = alpha[:-1] + np.ediff1d(alpha) / 2.
-            xm = x0 + mid * (x1 - x0)
-            ym = y0 + mid * (y1 - y0)
-            ix = np.floor(sy * xm).astype('int')
-            iy = np.floor(sy * ym).astype('int')
-
-            sim = np.dot(dist[ind], init[ix[ind], iy[ind]])
-            if not dist2 == 0:
-                upd = np.true_divide((data[m] - sim), dist2)
-                init[ix[ind], iy[ind]] += dist[ind] * upd
+        for m in range(A.shape[0]):
+            if dist2[m] == 0:
+                continue
+            row = slice(A.indptr[m], A.indptr[m + 1])
+            ind, dist = A.indices[row], A.data[row]
+            sim = np.dot(dist, x[ind])
+            upd = np.true_divide((data[m] - sim), dist2[m])
+            x[ind] += dist * upd
+    init[:] = x.reshape(init.shape)
     update_progress(1)
     return init
 
 
-def sirt(probe, data, init, niter=10):
-    """Reconstruct data using SIRT algorithm."""
-    sx, sy = init.shape
-    data = data.flatten()
+def sirt(probe, data, init, niter=10, threads=None):
+    """Reconstruct data using SIRT algorithm.
 
-    # grid frame (gx, gy)
-    gx = np.linspace(0, 1, sy + 1)
-    gy = np.linspace(0, 1, sy + 1)
+    The projections of each iteration are split between threads if threads
+    > 1.
+    """
+    projector = _projector(probe, init)
+    data = data.flatten()
 
     for n in range(niter):
+        update_progress(n/niter)
+        _sirt_update(projector, data, init, threads)
+    update_progress(1)
+    return init
 
-        update = np.zeros(init.shape)
-        sumdist = np.zeros(init.shape)
 
+def mlem(probe, data, init, niter=10, threads=None):
+    """Reconstruct data using MLEM algorithm.
+
+    The projections of each iteration are split between threads if threads
+    > 1.
+    """
+    projector = _projector(probe, init)
+    data = data.flatten()
+
+    for n in range(niter):
         update_progress(n/niter)
-        for m in range(len(probe.history)):
-            x0 = probe.history[m][0]
-            y0 = probe.history[m][1]
-            x1 = probe.history[m][2]
-            y1 = probe.history[m][3]
-
-            # avoid upper-right boundary errors
-            if (x1 - x0) == 0:
-                x0 += 1e-6
-            if (y1 - y0) == 0:
-                y0 += 1e-6
-
-            # vector lengths (ax, ay)
-            ax = (gx - x0) / (x1 - x0)
-            ay = (gy - y0) / (y1 - y0)
-
-            # edges of alpha (a0, a1)
-            ax0 = min(ax[0], ax[-1])
-            ax1 = max(ax[0], ax[-1])
-            ay0 = min(ay[0], ay[-1])
-            ay1 = max(ay[0], ay[-1])
-            a0 = max(max(ax0, ay0), 0)
-            a1 = min(min(ax1, ay1), 1)
-
-            # sorted alpha vector
-            cx = (ax >= a0) & (ax <= a1)
-            cy = (ay >= a0) & (ay <= a1)
-            alpha = np.sort(np.r_[ax[cx], ay[cy]])
-
-            # lengths
-            xv = x0 + alpha * (x1 - x0)
-            yv = y0 + alpha * (y1 - y0)
-            lx = np.ediff1d(xv)
-            ly = np.ediff1d(yv)
-            dist = np.sqrt(lx**2 + ly**2)
-            dist2 = np.dot(dist, dist)
-            ind = dist != 0
-
-            # indexing
-            mid = alpha[:-1] + np.ediff1d(alpha) / 2.
-            xm = x0 + mid * (x1 - x0)
-            ym = y0 + mid * (y1 - y0)
-            ix = np.floor(sy * xm).astype('int')
-            iy = np.floor(sy * ym).astype('int')
-
-            sumdist[ix[ind], iy[ind]] += dist
-            sim = np.dot(dist[ind], init[ix[ind], iy[ind]])
-            if not dist2 == 0:
-                upd = np.true_divide((data[m] - sim), dist2)
-                update[ix[ind], iy[ind]] += dist[ind] * upd
-
-        init += np.true_divide(update, sumdist * sy)
+        _mlem_update(projector, data, init, threads)
     update_progress(1)
     return init
 
 
-def mlem(probe, data, init, niter=10):
-    """Reconstruct data using MLEM algorithm."""
-    sx, sy = init.shape
-    data = data.flatten()
+def os_sirt(probe, data, init, niter=10, subsets=8, order='bit-reversed',
+            threads=None):
+    """Reconstruct data using ordered subsets SIRT.
 
-    # grid frame (gx, gy)
-    gx = np.linspace(0, 1, sy + 1)
-    gy = np.linspace(0, 1, sy + 1)
+    Each iteration applies the SIRT update once for each subset of the
+    projections instead of once for all of them. See
+    :func:`ordered_subsets`.
 
-    for n in range(niter):
+    Parameters
+    ----------
+    probe : Probe, Scan, or Projector
+    data : ndarray
+        The (projections, pixels) measurements; e.g. a sinogram.
+    init : ndarray
+        The initial guess; updated in place.
+    niter : int, optional
+        The number of passes over all of the subsets.
+    subsets : int, optional
+        The number of subsets. With one subset, this is :func:`sirt`.
+    order : str, optional
+        The order of the subsets; 'bit-reversed' or 'golden'.
+    threads : int, optional
+        The number of threads which split the projections of each update.
+    """
+    return _ordered_subsets_solve(_sirt_update, probe, data, init, niter,
+                                  subsets, order, threads)
+
+
+def osem(probe, data, init, niter=10, subsets=8, order='bit-reversed',
+         threads=None):
+    """Reconstruct data using ordered subsets expectation maximization.
+
+    Each iteration applies the MLEM update once for each subset of the
+    projections instead of once for all of them. See
+    :func:`ordered_subsets`.
+
+    Parameters
+    ----------
+    probe : Probe, Scan, or Projector
+    data : ndarray
+        The (projections, pixels) measurements; e.g. a sinogram.
+    init : ndarray
+        The initial guess; updated in place.
+    niter : int, optional
+        The number of passes over all of the subsets.
+    subsets : int, optional
+        The number of subsets. With one subset, this is :func:`mlem`.
+    order : str, optional
+        The order of the subsets; 'bit-reversed' or 'golden'.
+    threads : int, optional
+        The number of threads which split the projections of each update.
+    """
+    return _ordered_subsets_solve(_mlem_update, probe, data, init, niter,
+                                  subsets, order, threads)
+
+
+def ordered_subsets(projections, subsets, order='bit-reversed'):
+    """Return the subsets of the projections in the order to visit them.
 
-        update = np.zeros(init.shape)
-        sumdist = np.zeros(init.shape)
+    Projection i belongs to subset i % subsets, so each subset spans all of
+    the angles. Consecutive subsets should differ as much as possible, so
+    the subsets are not visited in numerical order.
 
+    Parameters
+    ----------
+    projections : int
+        The number of projections.
+    subsets : int
+        The number of subsets.
+    order : str, optional
+        'bit-reversed' visits the subsets in the order of the bit reversed
+        binary representation of their index; e.g. 0, 4, 2, 6, 1, 5, 3, 7.
+        'golden' visits the jth subset in the ascending order of the
+        fractional part of j times the golden ratio; e.g. 0, 5, 2, 7, 4, 1,
+        6, 3.
+
+    Returns
+    -------
+    subsets : list of ndarray
+        The indices of the projections in each subset.
+    """
+    subsets = max(1, min(subsets, projections))
+    if order == 'bit-reversed':
+        bits = max(1, int(np.ceil(np.log2(subsets))))
+        index = np.arange(2**bits)
+        reverse = np.zeros_like(index)
+        for b in range(bits):
+            reverse |= ((index >> b) & 1) << (bits - 1 - b)
+        sequence = reverse[reverse < subsets]
+    elif order == 'golden':
+        fraction = np.mod(np.arange(subsets) * (np.sqrt(5) - 1) / 2, 1)
+        sequence = np.argsort(np.argsort(fraction))
+    else:
+        raise ValueError("order must be 'bit-reversed' or 'golden', not "
+                         "{}.".format(order))
+    return [np.arange(k, projections, subsets) for k in sequence]
+
+
+def _ordered_subsets_solve(update, probe, data, init, niter, subsets, order,
+                           threads):
+    """Apply update for each ordered subset of the projections niter times."""
+    projector = _projector(probe, init)
+    data = np.reshape(data, (data.shape[0], -1))
+    pixels = data.shape[1]
+    rays = [(i[:, np.newaxis] * pixels + np.arange(pixels)).ravel()
+            for i in ordered_subsets(data.shape[0], subsets, order)]
+    parts = [(projector[r], data.ravel()[r]) for r in rays]
+
+    for n in range(niter):
         update_progress(n/niter)
-        for m in range(len(probe.history)):
-            x0 = probe.history[m][0]
-            y0 = probe.history[m][1]
-            x1 = probe.history[m][2]
-            y1 = probe.history[m][3]
-
-            # avoid upper-right boundary errors
-            if (x1 - x0) == 0:
-                x0 += 1e-6
-            if (y1 - y0) == 0:
-                y0 += 1e-6
-
-            # vector lengths (ax, ay)
-            ax = (gx - x0) / (x1 - x0)
-            ay = (gy - y0) / (y1 - y0)
-
-            # edges of alpha (a0, a1)
-            ax0 = min(ax[0], ax[-1])
-            ax1 = max(ax[0], ax[-1])
-            ay0 = min(ay[0], ay[-1])
-            ay1 = max(ay[0], ay[-1])
-            a0 = max(max(ax0, ay0), 0)
-            a1 = min(min(ax1, ay1), 1)
-
-            # sorted alpha vector
-            cx = (ax >= a0) & (ax <= a1)
-            cy = (ay >= a0) & (ay <= a1)
-            alpha = np.sort(np.r_[ax[cx], ay[cy]])
-
-            # lengths
-            xv = x0 + alpha * (x1 - x0)
-            yv = y0 + alpha * (y1 - y0)
-            lx = np.ediff1d(xv)
-            ly = np.ediff1d(yv)
-            dist = np.sqrt(lx**2 + ly**2)
-            dist2 = np.dot(dist, dist)
-            ind = dist != 0
-
-            # indexing
-            mid = alpha[:-1] + np.ediff1d(alpha) / 2.
-            xm = x0 + mid * (x1 - x0)
-            ym = y0 + mid * (y1 - y0)
-            ix = np.floor(sy * xm).astype('int')
-            iy = np.floor(sy * ym).astype('int')
-
-            sumdist[ix[ind], iy[ind]] += dist
-            sim = np.dot(dist[ind], init[ix[ind], iy[ind]])
-            if not sim == 0:
-                upd = np.true_divide(data[m], sim)
-                update[ix[ind], iy[ind]] += dist[ind] * upd
-
-        init[sumdist > 0] *= np.true_divide(update[sumdist > 0],
-                                            sumdist[sumdist > 0] * sy)
+        for part, part_data in parts:
+            update(part, part_data, init, threads)
     update_progress(1)
     return init
 
 
+def _sirt_update(projector, data, init, threads=None):
+    """Apply one SIRT update from the rays of projector to init."""
+    sx, sy = init.shape
+    dist2 = projector.dist2
+    sumdist = projector.sumdist
+    sim = projector.forward(init, threads)
+    upd = np.zeros(dist2.shape)
+    np.true_divide(data - sim, dist2, out=upd, where=dist2 != 0)
+    update = projector.back(upd, threads)
+    init[sumdist > 0] += np.true_divide(update[sumdist > 0],
+                                        sumdist[sumdist > 0] * sy)
+
+
+def _mlem_update(projector, data, init, threads=None):
+    """Apply one MLEM update from the rays of projector to init."""
+    sx, sy = init.shape
+    sumdist = projector.sumdist
+    sim = projector.forward(init, threads)
+    upd = np.zeros(sim.shape)
+    np.true_divide(data, sim, out=upd, where=sim != 0)
+    update = projector.back(upd, threads)
+    init[sumdist > 0] *= np.true_divide(update[sumdist > 0],
+                                        sumdist[sumdist > 0] * sy)
+
+
 def stream(probe, data, init):
     """Reconstruct data."""
-    sx, sy = init.shape
+    projector = _projector(probe, init)
     data = data.flatten()
 
-    # grid frame (gx, gy)
-    gx = np.linspace(0, 1, sy + 1)
-    gy = np.linspace(0, 1, sy + 1)
-
     for m in range(3000):
         print(m)
-
-        update = np.zeros(init.shape)
-        sumdist = np.zeros(init.shape)
-
-        for n in range(300):
-            x0 = probe.history[m+n][0]
-            y0 = probe.history[m+n][1]
-            x1 = probe.history[m+n][2]
-            y1 = probe.history[m+n][3]
-
-            # avoid upper-right boundary errors
-            if (x1 - x0) == 0:
-                x0 += 1e-6
-            if (y1 - y0) == 0:
-                y0 += 1e-6
-
-            # vector lengths (ax, ay)
-            ax = (gx - x0) / (x1 - x0)
-            ay = (gy - y0) / (y1 - y0)
-
-            # edges of alpha (a0, a1)
-            ax0 = min(ax[0], ax[-1])
-            ax1 = max(ax[0], ax[-1])
-            ay0 = min(ay[0], ay[-1])
-            ay1 = max(ay[0], ay[-1])
-            a0 = max(max(ax0, ay0), 0)
-            a1 = min(min(ax1, ay1), 1)
-
-            # sorted alpha vector
-            cx = (ax >= a0) & (ax <= a1)
-            cy = (ay >= a0) & (ay <= a1)
-            alpha = np.sort(np.r_[ax[cx], ay[cy]])
-
-            # lengths
-            xv = x0 + alpha * (x1 - x0)
-            yv = y0 + alpha * (y1 - y0)
-            lx = np.ediff1d(xv)
-            ly = np.ediff1d(yv)
-            dist = np.sqrt(lx**2 + ly**2)
-            dist2 = np.dot(dist, dist)
-            ind = dist != 0
-
-            # indexing
-            mid = alpha[:-1] + np.ediff1d(alpha) / 2.
-            xm = x0 + mid * (x1 - x0)
-            ym = y0 + mid * (y1 - y0)
-            ix = np.floor(sy * xm).astype('int')
-            iy = np.floor(sy * ym).astype('int')
-
-            sumdist[ix[ind], iy[ind]] += dist
-            sim = np.dot(dist[ind], init[ix[ind], iy[ind]])
-            if not sim == 0:
-                upd = np.true_divide(data[m+n], sim)
-                update[ix[ind], iy[ind]] += dist[ind] * upd
-
-        # init[sumdist > 0] += np.true_divide(update[sumdist > 0],
-        #                                     sumdist[sumdist > 0] * sy)
-        init[sumdist > 0] *= np.true_divide(update[sumdist > 0],
-                                            sumdist[sumdist > 0] * sy)
+        _mlem_update(projector[m:m+300], data[m:m+300], init)
     return init
@@ -63,7 +63,7 @@ from numbers import Number
 import polytope as pt
 from cached_property import cached_property
 import copy
-from math import sqrt, asin
+from math import sqrt, gamma
 
 logger = logging.getLogger(__name__)
 
@@ -72,6 +72,8 @@ __copyright__ = "Copyright (c) 2016, UChicago Argonne, LLC."
 __docformat__ = 'restructuredtext en'
 __all__ = ['Entity',
            'Point',
+           'Superellipse',
+           'Ellipse',
            'Circle',
            'Line',
            'Polygon',
@@ -628,11 +630,74 @@ class Superellipse(Curve):
         """Return list representation."""
         return [self.center.x, self.center.y, self.a, self.b, self.n]
 
+    @property
+    def radius(self):
+        """The radius of the bounding circle."""
+        if self.n <= 2:
+            return max(self.a, self.b)
+        return np.hypot(self.a, self.b)
+
+    @property
+    def area(self):
+        """Return area."""
+        return (4 * self.a * self.b * gamma(1 + 1 / self.n)**2 /
+                gamma(1 + 2 / self.n))
+
     def scale(self, val):
         """Scale."""
         self.a *= val
         self.b *= val
 
+    def halfwidth(self, direction):
+        """Return the largest distance from the center to a point of the
+        Superellipse measured along a unit direction vector."""
+        d = np.abs(np.asarray(direction, dtype=float) * [self.a, self.b])
+        if self.n <= 1:
+            return np.max(d)
+        q = self.n / (self.n - 1)
+        return np.sum(d**q)**(1 / q)
+
+    def boundary(self, num=256):
+        """Return an (num, 2) array of points on the boundary."""
+        t = np.linspace(0, 2 * np.pi, num, endpoint=False)
+        cos, sin = np.cos(t), np.sin(t)
+        return self.center._x + np.stack(
+            [self.a * np.sign(cos) * np.abs(cos)**(2 / self.n),
+             self.b * np.sign(sin) * np.abs(sin)**(2 / self.n)], axis=1)
+
+    def contains(self, other):
+        """Return whether the Superellipse contains the other.
+
+        Return one boolean for all geometric entities. Return an array of
+        boolean for array input. Curves are contained if points sampled along
+        their boundaries are contained.
+        """
+        if isinstance(other, Point):
+            x = other._x
+        elif isinstance(other, np.ndarray):
+            x = other
+        elif isinstance(other, Superellipse):
+            return np.all(self.contains(other.boundary()))
+        elif isinstance(other, Circle):
+            t = np.linspace(0, 2 * np.pi, 256, endpoint=False)
+            x = other.center._x + other.radius * np.stack([np.cos(t),
+                                                           np.sin(t)], 1)
+            return np.all(self.contains(x))
+        elif isinstance(other, Polygon):
+            x = _points_to_array(other.vertices)
+            return np.all(self.contains(x))
+        elif isinstance(other, Mesh):
+            for face in other.faces:
+                if not self.contains(face):
+                    return False
+            return True
+        else:
+            raise NotImplementedError("Superellipse.contains() not "
+                                      "implemented for {}".format(type(other)))
+
+        x = (x - self.center._x) / [self.a, self.b]
+        return np.sum(np.abs(x)**self.n, axis=-1) <= 1
+
 
 class Ellipse(Superellipse):
     """Ellipse in 2-D cartesian space.
@@ -740,6 +805,8 @@ class Circle(Curve):
         elif isinstance(other, Circle):
             return (other.center.distance(self.center) + other.radius
                     <= self.radius)
+        elif isinstance(other, Superellipse):
+            return np.all(self.contains(np.atleast_2d(other.boundary())))
         elif isinstance(other, Polygon):
             x = _points_to_array(other.vertices)
             return np.all(self.contains(x))
@@ -764,6 +831,35 @@ def _points_to_array(points):
     return np.atleast_2d(a)
 
 
+def _polygon_vertices(polygons):
+    """Return the (M, V, 2) vertices of M polygons.
+
+    Polygons with fewer than V vertices are padded by repeating their last
+    vertex which adds an edge of zero length.
+    """
+    V = max(p.numverts for p in polygons)
+    vertices = np.empty((len(polygons), V, 2))
+    for i, p in enumerate(polygons):
+        vertices[i, :p.numverts] = p.numpy
+        vertices[i, p.numverts:] = vertices[i, p.numverts - 1]
+    return vertices
+
+
+def _bounding_circle(geometry):
+    """Return the center and radius of a circle which contains the geometry."""
+    if isinstance(geometry, Mesh):
+        if not geometry.faces:
+            return np.zeros(2), 0
+        vertices = np.concatenate([f.numpy for f in geometry.faces])
+    elif isinstance(geometry, Polygon):
+        vertices = geometry.numpy
+    else:
+        return geometry.center._x, geometry.radius
+
+    center = (np.min(vertices, axis=0) + np.max(vertices, axis=0)) / 2
+    return center, np.max(np.sqrt(np.sum((vertices - center)**2, axis=1)))
+
+
 class Polygon(Entity):
     """A convex polygon in 2D cartesian space.
 
@@ -907,6 +1003,14 @@ class Polygon(Entity):
                         return False
                 return True
             return False
+        elif isinstance(other, Superellipse):
+            if self.contains(other.center):
+                for edge in self.edges:
+                    if (other.center.distance(edge) <
+                            other.halfwidth(edge.normal._x)):
+                        return False
+                return True
+            return False
         elif isinstance(other, Mesh):
             for face in other.faces:
                 if not self.contains(face):
@@ -1152,6 +1256,142 @@ class Mesh(Entity):
         return pt.Region(regions)
 
 
+class BoundingVolumeHierarchy(object):
+    """A binary tree of bounding circles for finding which of many circles
+    intersect many infinite strips.
+
+    The circles are split recursively in half along the axis of their
+    greatest extent until at most leaf_size circles remain in each node. Each
+    node stores a circle which bounds all of the circles below it, so a strip
+    which misses a node misses all of its circles.
+
+    Circles with an infinite radius are intersected by every strip.
+
+    Parameters
+    ----------
+    center : ndarray
+        The (M, 2) centers of the circles.
+    radius : ndarray
+        The (M,) radii of the circles.
+    leaf_size : int, optional
+        The maximum number of circles in a leaf node.
+    """
+
+    def __init__(self, center, radius, leaf_size=8):
+        self.center = np.array(center, dtype=float).reshape(-1, 2)
+        self.radius = np.array(radius, dtype=float).reshape(-1)
+        self.leaf_size = int(leaf_size)
+
+        # The nodes are stored as arrays; leaves have no children and refer
+        # to the circles items[start:stop].
+        self._node_center = []
+        self._node_radius = []
+        self._left = []
+        self._right = []
+        self._start = []
+        self._stop = []
+        items = []
+
+        if self.radius.size > 0:
+            self._build(np.arange(self.radius.size), items)
+
+        self._node_center = np.array(self._node_center).reshape(-1, 2)
+        self._node_radius = np.array(self._node_radius)
+        self._left = np.array(self._left, dtype=int)
+        self._right = np.array(self._right, dtype=int)
+        self._start = np.array(self._start, dtype=int)
+        self._stop = np.array(self._stop, dtype=int)
+        self._items = np.array(items, dtype=int)
+
+    def __len__(self):
+        return self.radius.size
+
+    def _build(self, index, items):
+        """Add the node containing the circles at index; return its id."""
+        center = self.center[index]
+        node_center = (np.min(center, axis=0) + np.max(center, axis=0)) / 2
+        node_radius = np.max(np.sqrt(np.sum((center - node_center)**2,
+                                            axis=1)) + self.radius[index])
+
+        node = len(self._node_radius)
+        self._node_center.append(node_center)
+        self._node_radius.append(node_radius)
+        self._left.append(-1)
+        self._right.append(-1)
+        self._start.append(len(items))
+        self._stop.append(len(items))
+
+        if index.size <= self.leaf_size:
+            items.extend(index)
+        else:
+            axis = np.argmax(np.ptp(center, axis=0))
+            index = index[np.argsort(center[:, axis], kind='mergesort')]
+            half = index.size // 2
+            self._left[node] = self._build(index[:half], items)
+            self._right[node] = self._build(index[half:], items)
+
+        self._stop[node] = len(items)
+        return node
+
+    def query(self, normal, offset, width):
+        """Return the pairs of strips and circles which intersect.
+
+        The strips are {x : abs(normal . x - offset) <= width}.
+
+        Parameters
+        ----------
+        normal : ndarray
+            The (N, 2) unit normals of the strips.
+        offset : ndarray
+            The (N,) signed distances from the origin to the strip centers.
+        width : ndarray
+            The (N,) half widths of the strips.
+
+        Returns
+        -------
+        strips, circles : ndarray
+            The indices of the intersecting strips and circles.
+        """
+        normal = np.asarray(normal, dtype=float).reshape(-1, 2)
+        offset, width = np.broadcast_arrays(offset, width)
+        offset, width = np.ravel(offset), np.ravel(width)
+
+        strips, circles = [np.empty(0, dtype=int)], [np.empty(0, dtype=int)]
+        if len(self) == 0:
+            return strips[0], circles[0]
+
+        # Walk down the tree one level at a time keeping the (strip, node)
+        # pairs which intersect.
+        nx, ny = normal[:, 0], normal[:, 1]
+        strip = np.arange(offset.size)
+        node = np.zeros(offset.size, dtype=int)
+        while strip.size > 0:
+            c = self._node_center[node]
+            hit = (np.abs(nx[strip] * c[:, 0] + ny[strip] * c[:, 1] -
+                          offset[strip])
+                   <= self._node_radius[node] + width[strip])
+            strip, node = strip[hit], node[hit]
+
+            leaf = self._left[node] < 0
+            s, n = strip[leaf], node[leaf]
+            count = self._stop[n] - self._start[n]
+            first = np.cumsum(count) - count
+            s = np.repeat(s, count)
+            i = self._items[np.arange(s.size) +
+                            np.repeat(self._start[n] - first, count)]
+            c = self.center[i]
+            hit = (np.abs(nx[s] * c[:, 0] + ny[s] * c[:, 1] - offset[s])
+                   <= self.radius[i] + width[s])
+            strips.append(s[hit])
+            circles.append(i[hit])
+
+            strip, node = strip[~leaf], node[~leaf]
+            strip = np.concatenate([strip, strip])
+            node = np.concatenate([self._left[node], self._right[node]])
+
+        return np.concatenate(strips), np.concatenate(circles)
+
+
 def calc_standard(A):
     """Returns the standard equation (c0*x = c1) coefficents for the hyper-plane
     defined by the row-wise ND points in A. Uses single value decomposition
@@ -1197,33 +1437,38 @@ def halfspacecirc(d, r):
     fraction of a circle split by a line d units away from the center of the
     circle.
 
+    Arrays of distances and radii are broadcast against each other, so many
+    lines and circles can be evaluated in a single call.
+
     Reference
     ---------
     Glassner, A. S. (Ed.). (2013). Graphics gems. Elsevier.
 
     Parameters
     ----------
-    d : scalar
+    d : scalar or ndarray
         The distance from the line to the center of the circle
-    r : scalar
+    r : scalar or ndarray
         The radius of the circle
 
     Returns
     -------
-    f : scalar
+    f : scalar or ndarray
         The proportion of the circle in the smaller half-space
     """
-    assert r > 0, "The radius must positive"
-    assert d >= 0, "The distance must be positive or zero."
+    d = np.asarray(d, dtype=float)
+    r = np.asarray(r, dtype=float)
+    assert np.all(r > 0), "The radius must positive"
+    assert np.all(d >= 0), "The distance must be positive or zero."
 
-    if d >= r:  # The line is too far away to overlap!
-        return 0
+    # The line is too far away to overlap when d >= r.
+    u = np.minimum(d / r, 1)
 
-    f = 0.5 - d*sqrt(r**2 - d**2)/(np.pi*r**2) - asin(d/r)/np.pi
+    f = 0.5 - (u * np.sqrt(1 - u**2) + np.arcsin(u)) / np.pi
 
     # Returns the smaller fraction of the circle, so it can be at most 1/2.
-    if f < 0 or 0.5 < f:
-        RuntimeWarning("halfspacecirc was out of bounds, {}".format(f))
-        f = 0
+    f = np.clip(f, 0, 0.5)
 
+    if f.ndim == 0:
+        return float(f)
     return f
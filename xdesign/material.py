@@ -138,9 +138,19 @@ class Material(object):
         """Electron density [e/cm^3]."""
         raise NotImplementedError
 
-    @property
     def linear_attenuation(self, energy):
-        """Total x-ray attenuation [1/cm]."""
+        """Total x-ray attenuation [1/cm].
+
+        Parameters
+        ----------
+        energy : ndarray
+            Photon energies [keV].
+
+        Returns
+        -------
+        ndarray
+            The attenuation at each energy.
+        """
         raise NotImplementedError
 
     @property
@@ -55,9 +55,12 @@ from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 
 from xdesign.geometry import *
+from xdesign.geometry import (BoundingVolumeHierarchy, _bounding_circle,
+                              _polygon_vertices)
 import numpy as np
 import logging
 import warnings
+from cached_property import cached_property
 
 logger = logging.getLogger(__name__)
 
@@ -66,6 +69,7 @@ __author__ = "Daniel Ching, Doga Gursoy"
 __copyright__ = "Copyright (c) 2016, UChicago Argonne, LLC."
 __docformat__ = 'restructuredtext en'
 __all__ = ['Phantom',
+           'CompiledPhantom',
            'save_phantom',
            'load_phantom']
 
@@ -110,16 +114,34 @@ class Phantom(object):
         The Phantom containing this Phantom.
     mass_atten :
         The mass_attenuation of the phantom.
+    material : :class:`.Material`, optional
+        What the phantom is made of. Polychromatic measurements scale
+        mass_atten by the linear attenuation of the material at each energy;
+        None for attenuation which does not depend on energy.
     population :
         The number of decendents of this phantom.
+    bvh : :class:`.BoundingVolumeHierarchy`
+        The bounding circles of the children. It is rebuilt after the
+        Phantom is changed by append, pop, translate, or rotate, or after
+        :meth:`refresh` finds a direct edit.
+    compiled : :class:`.CompiledPhantom`
+        The Phantom and its descendants flattened into arrays. It is rebuilt
+        after the Phantom or its descendants change, including direct edits
+        of their geometry or reordering of their children.
+    revision : int
+        Counts the changes made to the Phantom or its descendants. Direct
+        edits are counted when they are noticed by :meth:`refresh`.
     """
     # OPERATOR OVERLOADS
-    def __init__(self, geometry=None, children=[], mass_atten=0.0):
+    def __init__(self, geometry=None, children=[], mass_atten=0.0,
+                 material=None):
 
         self._geometry = geometry
         self.population = 0
         self.parent = None
         self.mass_atten = mass_atten
+        self.material = material
+        self.revision = 0
 
         self.children = list()
         for child in children:
@@ -192,6 +214,60 @@ class Phantom(object):
 
         return child_volume / self.volume
 
+    @cached_property
+    def bvh(self):
+        """Return a bounding volume hierarchy of the children.
+
+        Children without geometry have an infinite bounding circle.
+        """
+        center = np.zeros((len(self.children), 2))
+        radius = np.full(len(self.children), np.inf)
+        for i, child in enumerate(self.children):
+            if child.geometry is not None:
+                center[i], radius[i] = _bounding_circle(child.geometry)
+        return BoundingVolumeHierarchy(center, radius)
+
+    @property
+    def compiled(self):
+        """Return the Phantom flattened into a :class:`.CompiledPhantom`."""
+        self.refresh()
+        if 'compiled' not in self.__dict__:
+            self.__dict__['compiled'] = CompiledPhantom(self)
+        return self.__dict__['compiled']
+
+    def refresh(self):
+        """Forget cached bounds made stale by direct edits of the geometry,
+        mass_atten, or order of children of this Phantom or its descendants.
+
+        Changes made by append, pop, translate, or rotate are noticed without
+        calling this method. :attr:`compiled` calls it, so :func:`.project`
+        and :func:`.sinogram` see direct edits, but :meth:`.Probe.measure`
+        does not; call it once after editing in place and before measuring
+        ray by ray.
+        """
+        stack = [self]
+        while stack:
+            phantom = stack.pop()
+            key = (_shape_key(phantom.geometry), phantom.mass_atten,
+                   tuple(id(child) for child in phantom.children))
+            if phantom.__dict__.get('_key') != key:
+                if '_key' in phantom.__dict__:
+                    phantom._invalidate()
+                else:
+                    phantom.__dict__.pop('bvh', None)
+                    phantom.__dict__.pop('compiled', None)
+                phantom._key = key
+            stack.extend(phantom.children)
+
+    def _invalidate(self):
+        """Forget the cached bounds of this Phantom and its ancestors."""
+        phantom = self
+        while phantom is not None:
+            phantom.__dict__.pop('bvh', None)
+            phantom.__dict__.pop('compiled', None)
+            phantom.revision += 1
+            phantom = phantom.parent
+
     # GEOMETRIC TRANSFORMATIONS
     def translate(self, vector):
         """Translate the Phantom."""
@@ -201,6 +277,8 @@ class Phantom(object):
         if self._geometry is not None:
             self._geometry.translate(vector)
 
+        self._invalidate()
+
     def rotate(self, theta, point=Point([0.5, 0.5]), axis=None):
         """Rotate around an axis that passes through the given point."""
         for child in self.children:
@@ -209,6 +287,8 @@ class Phantom(object):
         if self._geometry is not None:
             self.geometry.rotate(theta, point, axis)
 
+        self._invalidate()
+
     # TREE MANIPULATION
     def append(self, child):
         """Add a child to the Phantom.
@@ -228,6 +308,7 @@ class Phantom(object):
             child.parent = self
             self.children.append(child)
             self.population += child.population + 1
+            self._invalidate()
             return True
 
         else:
@@ -237,6 +318,7 @@ class Phantom(object):
         """Pop the i-th child from the Phantom."""
         self.children[i].parent = None
         self.population -= self.children[i].population + 1
+        self._invalidate()
         return self.children.pop(i)
 
     def sprinkle(self, counts, radius, gap=0, region=None, mass_atten=1.0,
@@ -324,6 +406,135 @@ class Phantom(object):
         return n_added
 
 
+class CompiledPhantom(object):
+    """A Phantom flattened into arrays of geometric primitives.
+
+    Every Circle, Polygon, and Superellipse in the tree becomes one
+    primitive; each face of a Mesh becomes one Polygon primitive. Phantoms
+    without geometry contribute no primitives. Primitives are listed in
+    depth-first order, so parents come before their children.
+
+    Attributes
+    ----------
+    kind : ndarray
+        The (P, ) type code of each primitive; one of CIRCLE, POLYGON, or
+        SUPERELLIPSE.
+    params : ndarray
+        The (P, 5) parameters of each primitive. [x, y, radius, 0, 0] for
+        circles, [x, y, a, b, n] for superellipses, and [x, y, 0, 0, 0] for
+        polygons where x, y is the center.
+    polygon : ndarray
+        The (P, ) row of vertices of each Polygon primitive; -1 for others.
+    vertices : ndarray
+        The (Q, V, 2) vertices of the Polygon primitives.
+    mass_atten : ndarray
+        The (P, ) signed mass attenuation of the node of each primitive. The
+        measurement of a beam is the sum of the intersection areas of the
+        primitives it is allowed to reach weighted by mass_atten. It is read
+        from the Phantoms each time, so it may be changed without rebuilding.
+    material : list
+        The (P, ) material of the node of each primitive. Read from the
+        Phantoms each time like mass_atten.
+    node : ndarray
+        The (P, ) index of the Phantom node of each primitive. Faces of a
+        Mesh share a node.
+    parent : ndarray
+        The (M, ) index of the nearest ancestor of each node which has
+        geometry; -1 for none. A beam reaches a node only if it intersects
+        this ancestor.
+    depth : ndarray
+        The (M, ) number of ancestors with geometry of each node.
+    phantoms : list
+        The (M, ) Phantom of each node.
+    bvh : :class:`.BoundingVolumeHierarchy`
+        The bounding circles of the primitives.
+    """
+    CIRCLE, POLYGON, SUPERELLIPSE = range(3)
+
+    def __init__(self, phantom):
+        kind, params, polygons, node = [], [], [], []
+        parent, depth, phantoms = [], [], []
+        center, radius = [], []
+
+        def add(geometry, code, p, i):
+            kind.append(code)
+            params.append(p)
+            node.append(i)
+            c, r = _bounding_circle(geometry)
+            center.append(c)
+            radius.append(r)
+
+        def flatten(phantom, ancestor, level):
+            geometry = phantom.geometry
+            if geometry is not None:
+                i = len(parent)
+                parent.append(ancestor)
+                depth.append(level)
+                phantoms.append(phantom)
+                x, y = _bounding_circle(geometry)[0]
+                if isinstance(geometry, Mesh):
+                    for face in geometry.faces:
+                        add(face, self.POLYGON, [x, y, 0, 0, 0], i)
+                        polygons.append(face)
+                elif isinstance(geometry, Polygon):
+                    add(geometry, self.POLYGON, [x, y, 0, 0, 0], i)
+                    polygons.append(geometry)
+                elif isinstance(geometry, Circle):
+                    add(geometry, self.CIRCLE, [x, y, geometry.radius, 0, 0],
+                        i)
+                elif isinstance(geometry, Superellipse):
+                    add(geometry, self.SUPERELLIPSE,
+                        [x, y, geometry.a, geometry.b, geometry.n], i)
+                else:
+                    raise NotImplementedError("Cannot compile {}.".format(
+                                              type(geometry)))
+                ancestor, level = i, level + 1
+            for child in phantom.children:
+                flatten(child, ancestor, level)
+
+        flatten(phantom, -1, 0)
+
+        self.kind = np.array(kind, dtype=int)
+        self.params = np.array(params, dtype=float).reshape(-1, 5)
+        self.polygon = np.full(self.kind.size, -1)
+        self.polygon[self.kind == self.POLYGON] = np.arange(len(polygons))
+        if polygons:
+            self.vertices = _polygon_vertices(polygons)
+        else:
+            self.vertices = np.zeros((0, 1, 2))
+        self.node = np.array(node, dtype=int)
+        self.parent = np.array(parent, dtype=int)
+        self.depth = np.array(depth, dtype=int)
+        self.bvh = BoundingVolumeHierarchy(np.array(center).reshape(-1, 2),
+                                           np.array(radius, dtype=float))
+        self.phantoms = phantoms
+
+    def __len__(self):
+        return self.kind.size
+
+    @property
+    def mass_atten(self):
+        atten = np.array([p.mass_atten for p in self.phantoms], dtype=float)
+        return atten[self.node]
+
+    @property
+    def material(self):
+        return [self.phantoms[i].material for i in self.node]
+
+
+def _shape_key(geometry):
+    """Return a hashable summary of the position and shape of a geometry."""
+    if geometry is None:
+        return ()
+    if isinstance(geometry, Mesh):
+        return tuple(_shape_key(face) for face in geometry.faces)
+    if isinstance(geometry, Polygon):
+        values = geometry.numpy
+    else:
+        values = geometry.list
+    return (type(geometry),) + tuple(np.ravel(values))
+
+
 def _collision(phantom, circle):
         """Return the max overlap of the circle and a child of this Phantom.
 